@@ -0,0 +1,124 @@
+"""
+Micro-benchmarks of the scout hot path against the implementations they replaced:
+
+- AllTickers lookups against the linear scan over the ticker payload
+- RatioMatrix scores against the per-pair loop over the pairs of the current coin
+
+Run from the repository root with `python -m benchmarks.scout_benchmark`.
+"""
+import random
+import timeit
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from binance_trade_bot.binance_api_manager import AllTickers
+from binance_trade_bot.models import Coin, Pair
+from binance_trade_bot.ratio_matrix import RatioMatrix
+
+SYMBOL_COUNT = 2000
+COIN_COUNT = 60
+BRIDGE = "USDT"
+SCOUT_MULTIPLIER = 5.0
+FEES: Dict[str, float] = {}
+
+
+class LinearAllTickers:  # pylint: disable=too-few-public-methods
+    """
+    AllTickers as it was: a scan over the payload, parsing the price, for every lookup
+    """
+
+    def __init__(self, all_tickers: List[Dict]):
+        self.all_tickers = all_tickers
+
+    def get_price(self, ticker_symbol) -> Optional[float]:
+        ticker = next((t for t in self.all_tickers if t["symbol"] == ticker_symbol), None)
+        return float(ticker["price"]) if ticker else None
+
+
+def get_ticker_payload(coins: List[Coin]) -> List[Dict]:
+    symbols = [coin + BRIDGE for coin in coins]
+    symbols += [f"X{i:04d}BTC" for i in range(SYMBOL_COUNT - len(symbols))]
+    random.shuffle(symbols)
+    return [{"symbol": symbol, "price": f"{random.uniform(0.01, 100):.8f}"} for symbol in symbols]
+
+
+def get_ratios_per_pair(coin_price: float, pairs_from: List[Pair], all_tickers) -> Dict[Pair, float]:
+    """
+    The per-pair loop of AutoTrader._get_ratios that the ratio matrix replaced, over the pairs from
+    the current coin (without the query that loaded them)
+    """
+    ratio_dict: Dict[Pair, float] = {}
+    for pair in pairs_from:
+        optional_coin_price = all_tickers.get_price(pair.to_coin + BRIDGE)
+        if optional_coin_price is None:
+            continue
+        coin_opt_coin_ratio = coin_price / optional_coin_price
+        transaction_fee = get_fee(pair.from_coin) + get_fee(pair.to_coin)
+        ratio_dict[pair] = (coin_opt_coin_ratio - transaction_fee * SCOUT_MULTIPLIER * coin_opt_coin_ratio) - pair.ratio
+    return ratio_dict
+
+
+def get_ratios_matrix(coin: Coin, coin_price: float, ratio_matrix: RatioMatrix, all_tickers) -> Dict[Pair, float]:
+    """
+    AutoTrader._get_ratios with the ratio matrix, re-scoring the whole row of the coin
+    """
+    i = ratio_matrix.index[coin.symbol]
+    prices = all_tickers.get_prices([c + BRIDGE for c in ratio_matrix.coins])
+    prices[i] = coin_price
+    fees = np.array([get_fee(c) for c in ratio_matrix.coins])
+    ratio_matrix.scouts_since_full_rescore[i] = ratio_matrix.full_rescore_interval
+    ratio_matrix.update_scores_from(i, prices, get_fee(coin), fees, SCOUT_MULTIPLIER)
+    scores = ratio_matrix.scores[i]
+    return {pair: float(scores[j]) for j, pair in ratio_matrix.get_pairs_from(i) if not np.isnan(scores[j])}
+
+
+def get_fee(coin: Coin) -> float:
+    # A lookup in the fee table of the cycle
+    return FEES[coin.symbol]
+
+
+def report(name: str, statement, number: int):
+    duration = min(timeit.repeat(statement, number=number, repeat=5)) / number
+    print(f"{name:<40} {duration * 1e6:10.1f} us")
+
+
+def main():
+    random.seed(0)
+    coins = [Coin(f"C{i:02d}") for i in range(COIN_COUNT)]
+    FEES.update({coin.symbol: random.choice([0.001, 0.00075]) for coin in coins})
+    pairs = [
+        Pair(from_coin, to_coin, random.uniform(0.5, 2))
+        for from_coin in coins
+        for to_coin in coins
+        if from_coin != to_coin
+    ]
+    for pair in pairs:
+        pair.from_coin_id = pair.from_coin.symbol
+        pair.to_coin_id = pair.to_coin.symbol
+    payload = get_ticker_payload(coins)
+    lookups = [coin + BRIDGE for coin in coins] + ["MISSINGUSDT", "NOPEBTC"]
+
+    print(f"{SYMBOL_COUNT} tickers, {COIN_COUNT} coins, {len(pairs)} pairs")
+
+    linear_tickers = LinearAllTickers(payload)
+    all_tickers = AllTickers(payload)
+    report(f"linear scan, {len(lookups)} lookups", lambda: [linear_tickers.get_price(s) for s in lookups], 20)
+    report("AllTickers build", lambda: AllTickers(payload), 100)
+    report(f"AllTickers, {len(lookups)} lookups", lambda: [all_tickers.get_price(s) for s in lookups], 1000)
+
+    coin = coins[0]
+    coin_price = all_tickers.get_price(coin + BRIDGE)
+    pairs_from = [pair for pair in pairs if pair.from_coin_id == coin.symbol]
+    ratio_matrix = RatioMatrix(coins, pairs)
+    expected = get_ratios_per_pair(coin_price, pairs_from, all_tickers)
+    scores = get_ratios_matrix(coin, coin_price, ratio_matrix, all_tickers)
+    assert all(abs(scores[pair] - ratio) < 1e-9 for pair, ratio in expected.items())
+
+    report("per-pair loop, one scout", lambda: get_ratios_per_pair(coin_price, pairs_from, all_tickers), 100)
+    report("RatioMatrix build", lambda: RatioMatrix(coins, pairs), 20)
+    report("RatioMatrix, one scout", lambda: get_ratios_matrix(coin, coin_price, ratio_matrix, all_tickers), 100)
+
+
+if __name__ == "__main__":
+    main()
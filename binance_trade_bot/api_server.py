@@ -1,18 +1,22 @@
+import base64
+import gzip
+import json
 import re
 from datetime import datetime, timedelta
 from itertools import groupby
-from typing import List, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, Integer, and_, cast, func, or_
+from sqlalchemy.orm import Query, Session, contains_eager
 
 from .config import Config
 from .database import Database
 from .logger import Logger
-from .models import Coin, CoinValue, CurrentCoin, Pair, ScoutHistory, Trade
+from .models import Coin, CoinValue, CoinValueRollup, CurrentCoin, Interval, Pair, ScoutHistory, TotalValueRollup, Trade
+from .response_cache import ResponseCache
 
 app = Flask(__name__)
 cors = CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -23,99 +27,385 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 logger = Logger("api_server")
 config = Config()
 db = Database(logger, config)
-
-
-def filter_period(query, model):  # pylint: disable=inconsistent-return-statements
+# The views depend on the tables the bot sends updates for: the rollups are updated with the coin values,
+# and the ratios of the pairs when the current coin changes
+response_cache = ResponseCache()
+
+
+def parse_duration(duration: str) -> Optional[timedelta]:  # pylint: disable=inconsistent-return-statements
+    match = re.search(r"(\d*)([shdwm])", duration)
+    if match is None:
+        return None
+    num = float(match.group(1) or 1)
+    unit = match.group(2)
+
+    if unit == "s":
+        return timedelta(seconds=num)
+    if unit == "h":
+        return timedelta(hours=num)
+    if unit == "d":
+        return timedelta(days=num)
+    if unit == "w":
+        return timedelta(weeks=num)
+    if unit == "m":
+        return timedelta(days=28 * num)
+
+
+def get_period() -> Optional[timedelta]:
     period = request.args.get("period", "all")
 
     if period == "all":
+        return None
+
+    return parse_duration(period)
+
+
+def filter_period(query, model):
+    period = get_period()
+
+    if period is None:
         return query
 
-    num = float(re.search(r"(\d*)[shdwm]", "1d").group(1))
+    return query.filter(model.datetime >= datetime.now() - period)
+
+
+def get_rollup_interval() -> Optional[Interval]:
+    """
+    Get the rollup to read the value history of the requested period from, or None to read every
+    value logged. Minutely values are only kept for a day.
+    """
+    period = get_period()
+    if period is not None and period <= timedelta(days=1):
+        return None
+    if period is not None and period <= timedelta(days=28):
+        return Interval.HOURLY
+    if period is not None and period > timedelta(days=365):
+        return Interval.WEEKLY
+    return Interval.DAILY
+
+
+def get_resolution(query, datetime_column) -> Optional[int]:
+    """
+    Get the seconds per point requested, either as a `resolution` in the format of the period, or as
+    `max_points` over the period (or over the rows of the query for all of them). None to return
+    every row.
+    """
+    resolution = request.args.get("resolution")
+    if resolution:
+        duration = parse_duration(resolution)
+        if duration is None:
+            abort(400, "Invalid resolution")
+        return max(1, int(duration.total_seconds()))
+
+    max_points = request.args.get("max_points", type=int)
+    if not max_points or max_points < 1:
+        return None
+
+    span = get_period()
+    if span is None:
+        first, last = query.order_by(None).with_entities(func.min(datetime_column), func.max(datetime_column)).one()
+        if first is None:
+            return None
+        span = last - first
+    # The buckets don't start with the span, which may end in one more bucket
+    return max(1, int(span.total_seconds() / max(1, max_points - 1)) + 1)
+
+
+def get_bucket(datetime_column, resolution: int):
+    """
+    Number of the bucket of `resolution` seconds of datetime_column, computed by SQLite
+    """
+    return (cast(func.strftime("%s", datetime_column), Integer) / resolution).label("bucket")
+
+
+def get_bucket_datetime(bucket: int, resolution: int) -> datetime:
+    # strftime('%s') takes the stored datetimes as UTC
+    return datetime.utcfromtimestamp(bucket * resolution)
+
+
+# Rows loaded from the database at a time while streaming a history, and the largest page of one
+HISTORY_CHUNK_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Responses smaller than this aren't worth compressing
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 5
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, default=datetime.isoformat).encode()).decode()
+
+
+def get_cursor(key_columns: list) -> Optional[list]:
+    """
+    Get the values of key_columns of the last row already sent, from the cursor sent by the client
+    """
+    cursor = request.args.get("cursor")
+    if not cursor:
+        return None
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(key_columns, values)
+        ]
+    except (ValueError, TypeError):
+        return abort(400, "Invalid cursor")
+
+
+def filter_cursor(query, key_columns: list, cursor: Optional[list]):
+    """
+    Keep the rows after the cursor, in the order of key_columns
+    """
+    if cursor is None:
+        return query
 
-    if "s" in period:
-        return query.filter(model.datetime >= datetime.now() - timedelta(seconds=num))
-    if "h" in period:
-        return query.filter(model.datetime >= datetime.now() - timedelta(hours=num))
-    if "d" in period:
-        return query.filter(model.datetime >= datetime.now() - timedelta(days=num))
-    if "w" in period:
-        return query.filter(model.datetime >= datetime.now() - timedelta(weeks=num))
-    if "m" in period:
-        return query.filter(model.datetime >= datetime.now() - timedelta(days=28 * num))
+    # (a, b) > (x, y) as a > x or (a = x and b > y)
+    conditions = []
+    for i, (column, value) in enumerate(zip(key_columns, cursor)):
+        conditions.append(and_(*[c == v for c, v in zip(key_columns[:i], cursor[:i])], column > value))
+    return query.filter(or_(*conditions))
+
+
+def get_columns(infos: Iterable[Dict], symbol_fields: Tuple[str, ...] = ()) -> Dict:
+    """
+    Get the columnar form of the info() of rows, which doesn't repeat the field names and coins of every
+    row: the list of values of every field, with the coins (their info() or their symbol in
+    symbol_fields) replaced by their index in the list of symbols
+    """
+    symbols: Dict[str, int] = {}
+    columns: Dict[str, list] = {}
+    for info in infos:
+        for field, value in info.items():
+            if isinstance(value, dict) and "symbol" in value:
+                value = symbols.setdefault(value["symbol"], len(symbols))
+            elif field in symbol_fields:
+                value = symbols.setdefault(value, len(symbols))
+            columns.setdefault(field, []).append(value)
+    return {"symbols": list(symbols), "columns": columns}
+
+
+def history_response(build_query: Callable[[Session], Query], key_columns: list, group_by=None):
+    """
+    Respond with the rows of the query, serialized with their info(), or grouped by the coin symbol
+    returned by group_by in an object of lists.
+
+    With a `limit`, respond with at most that many rows after the `cursor`, and the cursor of the
+    next page in the X-Next-Cursor header. Otherwise stream every row after the cursor, loading
+    HISTORY_CHUNK_SIZE of them at a time, so that the memory used doesn't depend on the history size.
+
+    With `format=columns`, respond with the columns of the rows instead (see get_columns), and the
+    symbol of their coin in a "coin" column when grouped. These aren't streamed.
+    """
+    # Checked before streaming, which can't fail the request anymore
+    cursor = get_cursor(key_columns)
+    limit = request.args.get("limit", type=int)
+    columnar = request.args.get("format") == "columns"
+    if limit is not None or columnar:
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        session: Session
+        with db.db_session() as session:
+            query = filter_cursor(build_query(session), key_columns, cursor)
+            rows = query.limit(limit).all() if limit is not None else query.yield_per(HISTORY_CHUNK_SIZE)
+            if columnar:
+                if group_by is None:
+                    response = jsonify(get_columns(row.info() for row in rows))
+                else:
+                    response = jsonify(
+                        get_columns(({**row.info(), "coin": group_by(row)} for row in rows), symbol_fields=("coin",))
+                    )
+            elif group_by is None:
+                response = jsonify([row.info() for row in rows])
+            else:
+                response = jsonify({key: [row.info() for row in group] for key, group in groupby(rows, key=group_by)})
+            if limit is not None and len(rows) == limit:
+                last_row = rows[-1]
+                response.headers["X-Next-Cursor"] = encode_cursor([getattr(last_row, c.key) for c in key_columns])
+            return response
+
+    def generate():
+        encode = app.json_encoder(separators=(",", ":")).encode
+        session: Session
+        with db.db_session() as session:
+            query = filter_cursor(build_query(session), key_columns, cursor).yield_per(HISTORY_CHUNK_SIZE)
+            yield "[" if group_by is None else "{"
+            chunk = []
+            last_key = None
+            for i, row in enumerate(query):
+                if group_by is None:
+                    chunk.append(("," if i else "") + encode(row.info()))
+                else:
+                    key = group_by(row)
+                    if i == 0 or key != last_key:
+                        chunk.append(("]," if i else "") + encode(key) + ":[")
+                    else:
+                        chunk.append(",")
+                    chunk.append(encode(row.info()))
+                    last_key = key
+                if len(chunk) >= HISTORY_CHUNK_SIZE:
+                    yield "".join(chunk)
+                    chunk = []
+            if group_by is not None and last_key is not None:
+                chunk.append("]")
+            yield "".join(chunk) + ("]" if group_by is None else "}")
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
 
 
 @app.route("/api/value_history/<coin>")
 @app.route("/api/value_history")
+@response_cache.cached("coin_value")
 def value_history(coin: str = None):
-    session: Session
-    with db.db_session() as session:
-        query = session.query(CoinValue).order_by(CoinValue.coin_id.asc(), CoinValue.datetime.asc())
+    interval = get_rollup_interval()
+    model = CoinValue if interval is None else CoinValueRollup
+
+    def build_query(session: Session):
+        query = session.query(model).order_by(model.coin_id.asc(), model.datetime.asc(), model.id.asc())
+        if interval is not None:
+            query = query.filter(model.interval == interval)
 
-        query = filter_period(query, CoinValue)
+        query = filter_period(query, model)
 
         if coin:
-            values: List[CoinValue] = query.filter(CoinValue.coin_id == coin).all()
-            return jsonify([entry.info() for entry in values])
+            query = query.filter(model.coin_id == coin)
+        return query
 
-        coin_values = groupby(query.all(), key=lambda cv: cv.coin)
-        return jsonify({coin.symbol: [entry.info() for entry in history] for coin, history in coin_values})
+    session: Session
+    with db.db_session() as session:
+        resolution = get_resolution(build_query(session), model.datetime)
+        if resolution is not None:
+            bucket = get_bucket(model.datetime, resolution)
+            # With a single max(), SQLite takes the balance from the last row of the bucket
+            query = (
+                build_query(session)
+                .with_entities(
+                    model.coin_id,
+                    bucket,
+                    func.max(model.datetime),
+                    model.balance,
+                    func.avg(model.usd_value),
+                    func.avg(model.btc_value),
+                )
+                .group_by(model.coin_id, bucket)
+                .order_by(None)
+                .order_by(model.coin_id.asc(), bucket.asc())
+            )
+            values = [
+                (
+                    coin_id,
+                    {
+                        "balance": balance,
+                        "usd_value": usd_value,
+                        "btc_value": btc_value,
+                        "datetime": get_bucket_datetime(coin_bucket, resolution).isoformat(),
+                    },
+                )
+                for coin_id, coin_bucket, _, balance, usd_value, btc_value in query
+            ]
+            if coin:
+                if request.args.get("format") == "columns":
+                    return jsonify(get_columns(cv for _, cv in values))
+                return jsonify([cv for _, cv in values])
+            if request.args.get("format") == "columns":
+                return jsonify(
+                    get_columns(({**cv, "coin": coin_id} for coin_id, cv in values), symbol_fields=("coin",))
+                )
+            return jsonify(
+                {coin_id: [cv for _, cv in history] for coin_id, history in groupby(values, key=lambda v: v[0])}
+            )
+
+    if coin:
+        return history_response(build_query, [model.datetime, model.id])
+    return history_response(build_query, [model.coin_id, model.datetime, model.id], group_by=lambda cv: cv.coin_id)
 
 
 @app.route("/api/total_value_history")
+@response_cache.cached("coin_value")
 def total_value_history():
+    interval = get_rollup_interval()
     session: Session
     with db.db_session() as session:
-        query = session.query(
-            CoinValue.datetime,
-            func.sum(CoinValue.btc_value),
-            func.sum(CoinValue.usd_value),
-        ).group_by(CoinValue.datetime)
-
-        query = filter_period(query, CoinValue)
-
-        total_values: List[Tuple[datetime, float, float]] = query.all()
-        return jsonify([{"datetime": tv[0], "btc": tv[1], "usd": tv[2]} for tv in total_values])
+        if interval is not None:
+            query = session.query(
+                TotalValueRollup.datetime,
+                TotalValueRollup.btc_value,
+                TotalValueRollup.usd_value,
+            ).filter(TotalValueRollup.interval == interval)
+
+            query = filter_period(query, TotalValueRollup)
+
+            datetime_column = TotalValueRollup.datetime
+            btc_column, usd_column = TotalValueRollup.btc_value, TotalValueRollup.usd_value
+        else:
+            totals = session.query(
+                CoinValue.datetime.label("datetime"),
+                func.sum(CoinValue.btc_value).label("btc"),
+                func.sum(CoinValue.usd_value).label("usd"),
+            ).group_by(CoinValue.datetime)
+
+            totals = filter_period(totals, CoinValue).subquery()
+            query = session.query(totals)
+
+            datetime_column, btc_column, usd_column = totals.c.datetime, totals.c.btc, totals.c.usd
+
+        resolution = get_resolution(query, datetime_column)
+        if resolution is None:
+            total_values: List[Tuple[datetime, float, float]] = query.order_by(datetime_column.asc()).all()
+            return jsonify([{"datetime": tv[0], "btc": tv[1], "usd": tv[2]} for tv in total_values])
+
+        # The totals are averaged over the buckets
+        bucket = get_bucket(datetime_column, resolution)
+        query = query.with_entities(bucket, func.avg(btc_column), func.avg(usd_column)).group_by(bucket)
+        return jsonify(
+            [
+                {"datetime": get_bucket_datetime(total_bucket, resolution), "btc": btc, "usd": usd}
+                for total_bucket, btc, usd in query.order_by(bucket.asc())
+            ]
+        )
 
 
 @app.route("/api/trade_history")
+@response_cache.cached("trade_history")
 def trade_history():
-    session: Session
-    with db.db_session() as session:
-        query = session.query(Trade).order_by(Trade.datetime.asc())
+    def build_query(session: Session):
+        query = session.query(Trade).order_by(Trade.datetime.asc(), Trade.id.asc())
 
-        query = filter_period(query, Trade)
+        return filter_period(query, Trade)
 
-        trades: List[Trade] = query.all()
-        return jsonify([trade.info() for trade in trades])
+    return history_response(build_query, [Trade.datetime, Trade.id])
 
 
 @app.route("/api/scouting_history")
+@response_cache.cached("scout_history", "current_coin_history")
 def scouting_history():
     _current_coin = db.get_current_coin()
     coin = _current_coin.symbol if _current_coin is not None else None
-    session: Session
-    with db.db_session() as session:
+
+    def build_query(session: Session):
         query = (
             session.query(ScoutHistory)
             .join(ScoutHistory.pair)
+            .options(contains_eager(ScoutHistory.pair))
             .filter(Pair.from_coin_id == coin)
-            .order_by(ScoutHistory.datetime.asc())
+            .order_by(ScoutHistory.datetime.asc(), ScoutHistory.id.asc())
         )
 
-        query = filter_period(query, ScoutHistory)
+        return filter_period(query, ScoutHistory)
 
-        scouts: List[ScoutHistory] = query.all()
-        return jsonify([scout.info() for scout in scouts])
+    return history_response(build_query, [ScoutHistory.datetime, ScoutHistory.id])
 
 
 @app.route("/api/current_coin")
+@response_cache.cached("current_coin_history")
 def current_coin():
     coin = db.get_current_coin()
     return coin.info() if coin else None
 
 
 @app.route("/api/current_coin_history")
+@response_cache.cached("current_coin_history")
 def current_coin_history():
     session: Session
     with db.db_session() as session:
@@ -128,6 +418,7 @@ def current_coin_history():
 
 
 @app.route("/api/coins")
+@response_cache.cached("coins", "current_coin_history")
 def coins():
     session: Session
     with db.db_session() as session:
@@ -137,6 +428,7 @@ def coins():
 
 
 @app.route("/api/pairs")
+@response_cache.cached("pairs", "current_coin_history")
 def pairs():
     session: Session
     with db.db_session() as session:
@@ -144,9 +436,57 @@ def pairs():
         return jsonify([pair.info() for pair in all_pairs])
 
 
+def should_compress(response: Response) -> bool:
+    """
+    Whether to gzip the response: a complete one, large enough, for a client accepting it. A 304 gets
+    the headers of the gzipped response it revalidates.
+    """
+    if "gzip" not in request.accept_encodings:
+        return False
+    if response.status_code == 304:
+        data = response_cache.get_cached_data()
+        return data is not None and len(data) >= GZIP_MIN_SIZE
+    if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+        return False
+    return "Content-Encoding" not in response.headers and (response.content_length or 0) >= GZIP_MIN_SIZE
+
+
+def gzip_data(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Gzip the responses for the clients accepting it, except the streamed ones. The cached responses
+    are only compressed once, and their 304s carry the same validator as the gzipped response.
+    """
+    if not should_compress(response):
+        return response
+
+    if response.status_code == 200:
+        response.set_data(response_cache.get_encoded_data(response, "gzip", gzip_data))
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    # The compressed response is only equivalent to the uncompressed one
+    etag, _ = response.get_etag()
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    return response
+
+
 @socketio.on("update", namespace="/backend")
-def handle_my_custom_event(json):
-    emit("update", json, namespace="/frontend", broadcast=True)
+def handle_my_custom_event(message):
+    response_cache.invalidate(message["table"])
+    emit("update", message, namespace="/frontend", broadcast=True)
+
+
+@socketio.on("updates", namespace="/backend")
+def handle_updates(updates):
+    # The bot sends its updates in batches, the frontend still gets them one by one
+    for update in updates:
+        response_cache.invalidate(update["table"])
+        emit("update", update, namespace="/frontend", broadcast=True)
 
 
 if __name__ == "__main__":
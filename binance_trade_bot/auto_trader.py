@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+import numpy as np
 from sqlalchemy.orm import Session
 
 from .binance_api_manager import AllTickers, BinanceAPIManager
@@ -8,6 +9,8 @@ from .config import Config
 from .database import Database
 from .logger import Logger
 from .models import Coin, CoinValue, Pair
+from .ratio_matrix import RatioMatrix
+from .value_rollups import update_value_rollups
 
 
 class AutoTrader:
@@ -16,6 +19,10 @@ class AutoTrader:
         self.db = database
         self.logger = logger
         self.config = config
+        self.ratio_matrix: Optional[RatioMatrix] = None
+        # Pairs re-scored and skipped (unchanged since the previous scout) during the current scout
+        self.rescored_pairs = 0
+        self.skipped_pairs = 0
 
     def initialize(self):
         self.initialize_trade_thresholds()
@@ -56,18 +63,18 @@ class AutoTrader:
             self.logger.info("Skipping update... current coin {} not found".format(coin + self.config.BRIDGE))
             return
 
-        session: Session
-        with self.db.db_session() as session:
-            for pair in session.query(Pair).filter(Pair.to_coin == coin):
-                from_coin_price = all_tickers.get_price(pair.from_coin + self.config.BRIDGE)
+        ratios: Dict[int, float] = {}
+        for pair in self.db.get_pairs_to(coin, only_enabled=False):
+            from_coin_price = all_tickers.get_price(pair.from_coin + self.config.BRIDGE)
 
-                if from_coin_price is None:
-                    self.logger.info(
-                        "Skipping update for coin {} not found".format(pair.from_coin + self.config.BRIDGE)
-                    )
-                    continue
+            if from_coin_price is None:
+                self.logger.info("Skipping update for coin {} not found".format(pair.from_coin + self.config.BRIDGE))
+                continue
+
+            ratios[pair.id] = from_coin_price / coin_price
 
-                pair.ratio = from_coin_price / coin_price
+        self.db.set_ratios(ratios)
+        self.ratio_matrix = None
 
     def initialize_trade_thresholds(self):
         """
@@ -75,28 +82,28 @@ class AutoTrader:
         """
         all_tickers = self.manager.get_all_market_tickers()
 
-        session: Session
-        with self.db.db_session() as session:
-            for pair in session.query(Pair).filter(Pair.ratio.is_(None)).all():
-                if not pair.from_coin.enabled or not pair.to_coin.enabled:
-                    continue
-                self.logger.info(f"Initializing {pair.from_coin} vs {pair.to_coin}")
+        ratios: Dict[int, float] = {}
+        for pair in self.db.get_pairs():
+            if pair.ratio is not None:
+                continue
+            self.logger.info(f"Initializing {pair.from_coin} vs {pair.to_coin}")
 
-                from_coin_price = all_tickers.get_price(pair.from_coin + self.config.BRIDGE)
-                if from_coin_price is None:
-                    self.logger.info(
-                        "Skipping initializing {}, symbol not found".format(pair.from_coin + self.config.BRIDGE)
-                    )
-                    continue
+            from_coin_price = all_tickers.get_price(pair.from_coin + self.config.BRIDGE)
+            if from_coin_price is None:
+                self.logger.info(
+                    "Skipping initializing {}, symbol not found".format(pair.from_coin + self.config.BRIDGE)
+                )
+                continue
 
-                to_coin_price = all_tickers.get_price(pair.to_coin + self.config.BRIDGE)
-                if to_coin_price is None:
-                    self.logger.info(
-                        "Skipping initializing {}, symbol not found".format(pair.to_coin + self.config.BRIDGE)
-                    )
-                    continue
+            to_coin_price = all_tickers.get_price(pair.to_coin + self.config.BRIDGE)
+            if to_coin_price is None:
+                self.logger.info("Skipping initializing {}, symbol not found".format(pair.to_coin + self.config.BRIDGE))
+                continue
+
+            ratios[pair.id] = from_coin_price / to_coin_price
 
-                pair.ratio = from_coin_price / to_coin_price
+        self.db.set_ratios(ratios)
+        self.ratio_matrix = None
 
     def scout(self):
         """
@@ -104,33 +111,80 @@ class AutoTrader:
         """
         raise NotImplementedError()
 
+    def _start_scout_cycle(self):
+        """
+        Called by the strategies at the start of every scout
+        """
+        self.manager.invalidate_account_snapshot()
+        self.rescored_pairs = 0
+        self.skipped_pairs = 0
+
+    def _get_ratio_matrix(self) -> RatioMatrix:
+        """
+        Get the ratio thresholds of all enabled pairs, reloading them after they were updated
+        """
+        if self.ratio_matrix is None:
+            self.ratio_matrix = RatioMatrix(self.db.get_coins(), self.db.get_pairs())
+        return self.ratio_matrix
+
+    def _get_prices(self, ratio_matrix: RatioMatrix, all_tickers: AllTickers) -> np.ndarray:
+        return all_tickers.get_prices([coin + self.config.BRIDGE for coin in ratio_matrix.coins])
+
+    def _get_fees(self, coins: List[Coin], prices: np.ndarray, selling: bool) -> np.ndarray:
+        # Coins that aren't listed against the bridge don't have a fee, and can't be traded anyway
+        return np.array(
+            [
+                self.manager.get_fee(coin, self.config.BRIDGE, selling) if not np.isnan(price) else np.nan
+                for coin, price in zip(coins, prices)
+            ],
+            dtype=float,
+        )
+
     def _get_ratios(self, coin: Coin, coin_price: float, all_tickers: AllTickers):
         """
         Given a coin, get the current price ratio for every other enabled coin
         """
         ratio_dict: Dict[Pair, float] = {}
 
-        for pair in self.db.get_pairs_from(coin):
-            optional_coin_price = all_tickers.get_price(pair.to_coin + self.config.BRIDGE)
-
-            if optional_coin_price is None:
-                self.logger.info(
-                    "Skipping scouting... optional coin {} not found".format(pair.to_coin + self.config.BRIDGE)
-                )
-                continue
-
-            self.db.log_scout(pair, pair.ratio, coin_price, optional_coin_price)
+        ratio_matrix = self._get_ratio_matrix()
+        i = ratio_matrix.index.get(coin.symbol)
+        if i is None:
+            return ratio_dict
+
+        prices = self._get_prices(ratio_matrix, all_tickers)
+        prices[i] = coin_price
+
+        rescored = ratio_matrix.update_scores_from(
+            i,
+            prices,
+            self.manager.get_fee(coin, self.config.BRIDGE, True),
+            self._get_fees(ratio_matrix.coins, prices, False),
+            self.config.SCOUT_MULTIPLIER,
+        )
+        scores = ratio_matrix.scores[i]
+
+        for j, pair in ratio_matrix.get_pairs_from(i):
+            if not rescored[j]:
+                self.skipped_pairs += 1
+            else:
+                self.rescored_pairs += 1
+
+                if np.isnan(prices[j]):
+                    self.logger.info(
+                        "Skipping scouting... optional coin {} not found".format(pair.to_coin + self.config.BRIDGE)
+                    )
+                    continue
 
-            # Obtain (current coin)/(optional coin)
-            coin_opt_coin_ratio = coin_price / optional_coin_price
+                self.db.log_scout(pair, pair.ratio, coin_price, float(prices[j]))
 
-            transaction_fee = self.manager.get_fee(pair.from_coin, self.config.BRIDGE, True) + self.manager.get_fee(
-                pair.to_coin, self.config.BRIDGE, False
-            )
+            if not np.isnan(scores[j]):
+                ratio_dict[pair] = float(scores[j])
 
-            ratio_dict[pair] = (
-                coin_opt_coin_ratio - transaction_fee * self.config.SCOUT_MULTIPLIER * coin_opt_coin_ratio
-            ) - pair.ratio
+        self.db.flush_scout_history()
+        self.logger.debug(
+            f"Scout cycle: {self.rescored_pairs} pairs re-scored, {self.skipped_pairs} unchanged pairs skipped",
+            notification=False,
+        )
         return ratio_dict
 
     def _jump_to_best_coin(self, coin: Coin, coin_price: float, all_tickers: AllTickers):
@@ -155,14 +209,21 @@ class AutoTrader:
         bridge_balance = self.manager.get_currency_balance(self.config.BRIDGE.symbol)
         all_tickers = self.manager.get_all_market_tickers()
 
-        for coin in self.db.get_coins():
-            current_coin_price = all_tickers.get_price(coin + self.config.BRIDGE)
-
-            if current_coin_price is None:
+        ratio_matrix = self._get_ratio_matrix()
+        prices = self._get_prices(ratio_matrix, all_tickers)
+        scores = ratio_matrix.get_scores(
+            prices,
+            self._get_fees(ratio_matrix.coins, prices, True),
+            self._get_fees(ratio_matrix.coins, prices, False),
+            self.config.SCOUT_MULTIPLIER,
+        )
+
+        for i, coin in enumerate(ratio_matrix.coins):
+            if np.isnan(prices[i]):
                 continue
 
-            ratio_dict = self._get_ratios(coin, current_coin_price, all_tickers)
-            if not any(v > 0 for v in ratio_dict.values()):
+            # NaN scores compare as False, so pairs that can't be scored are ignored here
+            if not np.any(scores[i] > 0):
                 # There will only be one coin where all the ratios are negative. When we find it, buy it if we can
                 if bridge_balance > self.manager.get_min_notional(coin.symbol, self.config.BRIDGE.symbol):
                     self.logger.info(f"Will be purchasing {coin} using bridge coin")
@@ -174,6 +235,7 @@ class AutoTrader:
         """
         Log current value state of all altcoin balances against BTC and USDT in DB.
         """
+        self.manager.invalidate_account_snapshot()
         all_ticker_values = self.manager.get_all_market_tickers()
 
         now = datetime.now()
@@ -181,6 +243,7 @@ class AutoTrader:
         session: Session
         with self.db.db_session() as session:
             coins: List[Coin] = session.query(Coin).all()
+            coin_values: List[CoinValue] = []
             for coin in coins:
                 balance = self.manager.get_currency_balance(coin.symbol)
                 if balance == 0:
@@ -189,4 +252,6 @@ class AutoTrader:
                 btc_value = all_ticker_values.get_price(coin + "BTC")
                 cv = CoinValue(coin, balance, usd_value, btc_value, datetime=now)
                 session.add(cv)
+                coin_values.append(cv)
                 self.db.send_update(cv)
+            update_value_rollups(session, coin_values)
@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Dict, List
+
+
+class BalanceLedger:
+    """
+    Balances of every asset kept in memory from the outboundAccountPosition events of the user data
+    stream, and reconciled against the REST account endpoint from time to time.
+
+    Binance only sends account events when a balance changes, so the ledger is considered fresh for
+    `max_age` seconds after the last event or reconciliation.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.updates = 0
+        self.balances: Dict[str, Dict] = {}
+        # Binance time (ms) of the last change applied to each asset, so that an event older than
+        # the last reconciliation can't overwrite it
+        self.asset_times: Dict[str, int] = {}
+        self.last_sync_time = None
+
+    def apply_account_position(self, event_time: int, balances: List[Dict]):
+        with self.lock:
+            for balance in balances:
+                asset = balance["asset"]
+                if self.asset_times.get(asset, 0) > event_time:
+                    continue
+                self.balances[asset] = balance
+                self.asset_times[asset] = event_time
+            if self.last_sync_time is not None:
+                self.last_sync_time = time.monotonic()
+            self.updates += 1
+            self.condition.notify_all()
+
+    def wait_for_update(self, timeout: float):
+        """
+        Wait up to timeout seconds for the next account update from the stream
+        """
+        with self.lock:
+            updates = self.updates
+            self.condition.wait_for(lambda: self.updates != updates, timeout)
+
+    def reconcile(self, account_info: Dict) -> List[str]:
+        """
+        Replace the ledger with the account returned by the REST API, and return the assets whose
+        free balance was out of sync
+        """
+        update_time = account_info.get("updateTime", 0)
+        with self.lock:
+            out_of_sync = []
+            for balance in account_info["balances"]:
+                asset = balance["asset"]
+                if self.asset_times.get(asset, 0) > update_time:
+                    # The stream already reported a more recent change of this asset
+                    continue
+                known_balance = self.balances.get(asset)
+                if known_balance is not None and float(known_balance["free"]) != float(balance["free"]):
+                    out_of_sync.append(asset)
+                self.balances[asset] = balance
+                self.asset_times[asset] = update_time
+            self.last_sync_time = time.monotonic()
+            return out_of_sync
+
+    def is_fresh(self, max_age: float) -> bool:
+        with self.lock:
+            return self.last_sync_time is not None and time.monotonic() - self.last_sync_time <= max_age
+
+    def get_account(self) -> Dict:
+        """
+        Get the balances in the same format as the REST account endpoint
+        """
+        with self.lock:
+            return {"balances": list(self.balances.values())}
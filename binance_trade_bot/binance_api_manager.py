@@ -1,37 +1,115 @@
 import math
 import time
-from typing import Dict, List
+import uuid
+from typing import Dict, List, Optional, Tuple
 
-from binance.client import Client
+import numpy as np
 from binance.exceptions import BinanceAPIException
 from cachetools import TTLCache, cached
 
+from .binance_client import BinanceClient
 from .config import Config
 from .database import Database
 from .logger import Logger
 from .models import Coin
+from .rate_limiter import WEIGHT_EXCEEDED_ERROR
+from .symbol_info import SymbolInfoStore
+from .transport import get_backoff_delay
 
 
 class AllTickers:  # pylint: disable=too-few-public-methods
     def __init__(self, all_tickers: List[Dict]):
-        self.all_tickers = all_tickers
+        # Index the snapshot once so that every lookup is a single dict access instead of a
+        # scan over the ~2000 symbols listed on Binance
+        self.prices: Dict[str, float] = {ticker["symbol"]: float(ticker["price"]) for ticker in all_tickers}
 
     def get_price(self, ticker_symbol):
-        ticker = next((t for t in self.all_tickers if t["symbol"] == ticker_symbol), None)
-        return float(ticker["price"]) if ticker else None
+        return self.prices.get(ticker_symbol)
+
+    def get_prices(self, ticker_symbols: List[str]) -> np.ndarray:
+        """
+        Get the prices of several tickers as an array, with NaN for the ones that aren't listed
+        """
+        return np.array([self.get_price(ticker_symbol) for ticker_symbol in ticker_symbols], dtype=float)
+
+
+class AccountSnapshot:  # pylint: disable=too-few-public-methods
+    def __init__(self, account: Dict):
+        self.balances: Dict[str, float] = {balance["asset"]: float(balance["free"]) for balance in account["balances"]}
+
+    def get_balance(self, currency_symbol: str):
+        return self.balances.get(currency_symbol)
+
+
+class FeeTable:  # pylint: disable=too-few-public-methods
+    """
+    Effective fee of the symbols traded during a cycle, BNB discount included.
+
+    The discount depends on the balances and prices, which are taken from the account snapshot and
+    ticker snapshot of the cycle, so evaluating a fee costs no request and is only done once per
+    symbol and side.
+    """
+
+    def __init__(self, manager: "BinanceAPIManager", all_tickers: AllTickers):
+        self.manager = manager
+        self.all_tickers = all_tickers
+        self.fees: Dict[Tuple[str, str, bool], float] = {}
+
+    def get_fee(self, origin_coin: Coin, target_coin: Coin, selling: bool):
+        key = (origin_coin.symbol, target_coin.symbol, selling)
+        fee = self.fees.get(key)
+        if fee is None:
+            fee = self.fees[key] = self._get_effective_fee(origin_coin, target_coin, selling)
+        return fee
+
+    def _get_effective_fee(self, origin_coin: Coin, target_coin: Coin, selling: bool):
+        base_fee = self.manager.get_trade_fees()[origin_coin + target_coin]
+        if not self.manager.get_using_bnb_for_fees():
+            return base_fee
+        # The discount is only applied if we have enough BNB to cover the fee
+        if selling:
+            amount_trading = self.manager._sell_quantity(  # pylint: disable=protected-access
+                origin_coin.symbol, target_coin.symbol
+            )
+        else:
+            from_coin_price = self.all_tickers.get_price(origin_coin + target_coin)
+            if from_coin_price is None:
+                return base_fee
+            amount_trading = self.manager._buy_quantity(  # pylint: disable=protected-access
+                origin_coin.symbol, target_coin.symbol, from_coin_price=from_coin_price
+            )
+        fee_amount = amount_trading * base_fee * 0.75
+        if origin_coin.symbol == "BNB":
+            fee_amount_bnb = fee_amount
+        else:
+            origin_price = self.all_tickers.get_price(origin_coin + Coin("BNB"))
+            if origin_price is None:
+                return base_fee
+            fee_amount_bnb = fee_amount * origin_price
+        bnb_balance = self.manager.get_currency_balance("BNB")
+        if bnb_balance >= fee_amount_bnb:
+            return base_fee * 0.75
+        return base_fee
 
 
 class BinanceAPIManager:
     def __init__(self, config: Config, db: Database, logger: Logger):
         # initializing the client class calls `ping` API endpoint, verifying the connection
-        self.binance_client = Client(
+        self.binance_client = BinanceClient(
             config.BINANCE_API_KEY,
             config.BINANCE_API_SECRET_KEY,
             tld=config.BINANCE_TLD,
+            pool_size=config.HTTP_POOL_SIZE,
+            timeout=config.HTTP_TIMEOUT,
+            order_timeout=config.ORDER_HTTP_TIMEOUT,
+            retries=config.HTTP_RETRIES,
         )
         self.db = db
         self.logger = logger
         self.config = config
+        self.account_snapshot: Optional[AccountSnapshot] = None
+        self.fee_table: Optional[FeeTable] = None
+        self.symbol_info = SymbolInfoStore(self.binance_client, logger)
 
     @cached(cache=TTLCache(maxsize=1, ttl=43200))
     def get_trade_fees(self) -> Dict[str, float]:
@@ -41,28 +119,16 @@ class BinanceAPIManager:
     def get_using_bnb_for_fees(self):
         return self.binance_client.get_bnb_burn_spot_margin()["spotBNBBurn"]
 
+    def get_fee_table(self) -> FeeTable:
+        """
+        Get the fees of the current cycle, evaluated against the latest ticker and account snapshots
+        """
+        if self.fee_table is None:
+            self.fee_table = FeeTable(self, self.get_all_market_tickers())
+        return self.fee_table
+
     def get_fee(self, origin_coin: Coin, target_coin: Coin, selling: bool):
-        base_fee = self.get_trade_fees()[origin_coin + target_coin]
-        if not self.get_using_bnb_for_fees():
-            return base_fee
-        # The discount is only applied if we have enough BNB to cover the fee
-        amount_trading = (
-            self._sell_quantity(origin_coin.symbol, target_coin.symbol)
-            if selling
-            else self._buy_quantity(origin_coin.symbol, target_coin.symbol)
-        )
-        fee_amount = amount_trading * base_fee * 0.75
-        if origin_coin.symbol == "BNB":
-            fee_amount_bnb = fee_amount
-        else:
-            origin_price = self.get_market_ticker_price(origin_coin + Coin("BNB"))
-            if origin_price is None:
-                return base_fee
-            fee_amount_bnb = fee_amount * origin_price
-        bnb_balance = self.get_currency_balance("BNB")
-        if bnb_balance >= fee_amount_bnb:
-            return base_fee * 0.75
-        return base_fee
+        return self.get_fee_table().get_fee(origin_coin, target_coin, selling)
 
     def get_account(self):
         """
@@ -74,7 +140,9 @@ class BinanceAPIManager:
         """
         Get ticker price of all coins
         """
-        return AllTickers(self.binance_client.get_all_tickers())
+        all_tickers = AllTickers(self.binance_client.get_all_tickers())
+        self.fee_table = FeeTable(self, all_tickers)
+        return all_tickers
 
     def get_market_ticker_price(self, ticker_symbol: str):
         """
@@ -85,17 +153,40 @@ class BinanceAPIManager:
                 return float(ticker["price"])
         return None
 
+    def get_account_snapshot(self) -> AccountSnapshot:
+        """
+        Get the balances of all coins, fetching them only once per scout/update cycle
+        """
+        if self.account_snapshot is None:
+            self.account_snapshot = AccountSnapshot(self.binance_client.get_account())
+        return self.account_snapshot
+
+    def invalidate_account_snapshot(self):
+        """
+        Make the next balance lookup fetch the account again, at the start of a cycle or once an order
+        changed the balances
+        """
+        self.account_snapshot = None
+        # The BNB discount depends on the balances
+        self.fee_table = None
+
     def get_currency_balance(self, currency_symbol: str):
         """
         Get balance of a specific coin
         """
-        for currency_balance in self.binance_client.get_account()["balances"]:
-            if currency_balance["asset"] == currency_symbol:
-                return float(currency_balance["free"])
-        return None
+        return self.get_account_snapshot().get_balance(currency_symbol)
+
+    def _warn_if_rate_limited(self, e: Exception):
+        """
+        Tell how long requests are held back for when an error is Binance refusing a request over the
+        weight limit
+        """
+        if isinstance(e, BinanceAPIException) and e.code == WEIGHT_EXCEEDED_ERROR:
+            # the client holds back every request until the weight limit resets
+            block_time = self.binance_client.rate_limiter.get_block_time()
+            self.logger.warning(f"Request weight exceeded, requests are held back for {block_time:.0f}s")
 
     def retry(self, func, *args, **kwargs):
-        time.sleep(1)
         attempts = 0
         while attempts < 20:
             try:
@@ -104,31 +195,42 @@ class BinanceAPIManager:
                 self.logger.info("Failed to Buy/Sell. Trying Again.")
                 if attempts == 0:
                     self.logger.info(e)
+                self._warn_if_rate_limited(e)
+                time.sleep(get_backoff_delay(attempts, base=1, max_delay=10))
                 attempts += 1
         return None
 
+    def log_latency_stats(self):
+        for endpoint, stats in sorted(self.binance_client.get_latency_percentiles().items()):
+            self.logger.info(
+                f"{endpoint}: {stats['count']} calls, p50 {stats['p50']:.0f}ms, p90 {stats['p90']:.0f}ms, "
+                f"p99 {stats['p99']:.0f}ms",
+                notification=False,
+            )
+
     def get_symbol_filter(self, origin_symbol: str, target_symbol: str, filter_type: str):
-        return next(
-            _filter
-            for _filter in self.binance_client.get_symbol_info(origin_symbol + target_symbol)["filters"]
-            if _filter["filterType"] == filter_type
-        )
+        return self.symbol_info.get(origin_symbol + target_symbol).filters[filter_type]
 
-    @cached(cache=TTLCache(maxsize=2000, ttl=43200))
     def get_alt_tick(self, origin_symbol: str, target_symbol: str):
-        step_size = self.get_symbol_filter(origin_symbol, target_symbol, "LOT_SIZE")["stepSize"]
-        if step_size.find("1") == 0:
-            return 1 - step_size.find(".")
-        return step_size.find("1") - 1
+        return self.symbol_info.get(origin_symbol + target_symbol).alt_tick
 
-    @cached(cache=TTLCache(maxsize=2000, ttl=43200))
     def get_min_notional(self, origin_symbol: str, target_symbol: str):
-        return float(self.get_symbol_filter(origin_symbol, target_symbol, "MIN_NOTIONAL")["minNotional"])
+        return self.symbol_info.get(origin_symbol + target_symbol).min_notional
+
+    def _get_order_status(self, origin_symbol: str, target_symbol: str, order_id):
+        return self.binance_client.get_order(symbol=origin_symbol + target_symbol, orderId=order_id)
+
+    def _wait_for_order_status(self, origin_symbol: str, target_symbol: str, order_status):
+        """
+        Wait for the order to progress and get its new status, by polling every second
+        """
+        time.sleep(1)
+        return self._get_order_status(origin_symbol, target_symbol, order_status["orderId"])
 
     def wait_for_order(self, origin_symbol, target_symbol, order_id):
         while True:
             try:
-                order_status = self.binance_client.get_order(symbol=origin_symbol + target_symbol, orderId=order_id)
+                order_status = self._get_order_status(origin_symbol, target_symbol, order_id)
                 break
             except BinanceAPIException as e:
                 self.logger.info(e)
@@ -141,7 +243,7 @@ class BinanceAPIManager:
 
         while order_status["status"] != "FILLED":
             try:
-                order_status = self.binance_client.get_order(symbol=origin_symbol + target_symbol, orderId=order_id)
+                order_status = self._wait_for_order_status(origin_symbol, target_symbol, order_status)
 
                 if self._should_cancel_order(order_status):
                     cancel_order = None
@@ -150,6 +252,7 @@ class BinanceAPIManager:
                             symbol=origin_symbol + target_symbol, orderId=order_id
                         )
                     self.logger.info("Order timeout, canceled...")
+                    self.invalidate_account_snapshot()
 
                     # sell partially
                     if order_status["status"] == "PARTIALLY_FILLED" and order_status["side"] == "BUY":
@@ -168,8 +271,6 @@ class BinanceAPIManager:
                 if order_status["status"] == "CANCELED":
                     self.logger.info("Order is canceled, going back to scouting mode...")
                     return None
-
-                time.sleep(1)
             except BinanceAPIException as e:
                 self.logger.info(e)
                 time.sleep(1)
@@ -179,6 +280,46 @@ class BinanceAPIManager:
 
         return order_status
 
+    def _wait_for_balance_update(self, timeout: float):
+        """
+        Wait before checking a balance again, subclasses receiving account updates can return earlier
+        """
+        time.sleep(timeout)
+
+    def wait_for_balance_settlement(self, currency_symbol: str, origin_balance: float, order_status, timeout=30):
+        """
+        Wait for the balance of a coin that was sold to reflect the fill, so that the following buy
+        sees the proceeds. Gives up after timeout seconds.
+        """
+        start_time = time.monotonic()
+        # The fill tells how much should have left the account, otherwise wait for any decrease
+        executed_qty = float(order_status.get("executedQty") or 0)
+        settled_balance = origin_balance - executed_qty if executed_qty else origin_balance
+
+        polls = 0
+        delay = 0.1
+        while True:
+            self.invalidate_account_snapshot()
+            balance = self.get_currency_balance(currency_symbol)
+            polls += 1
+            elapsed = time.monotonic() - start_time
+            if balance is not None and (
+                balance <= settled_balance + 1e-8 if executed_qty else balance < settled_balance
+            ):
+                self.logger.info(
+                    f"Balance of {currency_symbol} settled after {elapsed:.2f}s and {polls} checks",
+                    notification=False,
+                )
+                return balance
+            if elapsed >= timeout:
+                self.logger.warning(
+                    f"Balance of {currency_symbol} still {balance} after {elapsed:.2f}s and {polls} checks, "
+                    f"expected {settled_balance}"
+                )
+                return balance
+            self._wait_for_balance_update(min(delay, timeout - elapsed))
+            delay = min(delay * 2, 2)
+
     def _should_cancel_order(self, order_status):
         minutes = (time.time() - order_status["time"] / 1000) / 60
         timeout = 0
@@ -202,6 +343,35 @@ class BinanceAPIManager:
 
         return False
 
+    def _place_order(self, order_func, symbol: str, attempts=5, **params):
+        """
+        Place an order, trying again with backoff a few times before giving up. Every attempt uses
+        the same client order id, so that an order placed by an attempt that failed is found instead
+        of being placed twice.
+        """
+        client_order_id = f"btb_{uuid.uuid4().hex[:24]}"
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(get_backoff_delay(attempt - 1, base=1))
+                order = self._find_order(symbol, client_order_id)
+                if order is not None:
+                    return order
+            try:
+                return order_func(symbol=symbol, newClientOrderId=client_order_id, **params)
+            except BinanceAPIException as e:
+                self.logger.info(e)
+                self._warn_if_rate_limited(e)
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.info(f"Unexpected Error: {e}")
+        self.logger.warning(f"Couldn't place order on {symbol} after {attempts} attempts")
+        return None
+
+    def _find_order(self, symbol: str, client_order_id: str):
+        try:
+            return self.binance_client.get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException:
+            return None
+
     def buy_alt(self, origin_coin: Coin, target_coin: Coin, all_tickers: AllTickers):
         return self.retry(self._buy_alt, origin_coin, target_coin, all_tickers)
 
@@ -212,7 +382,7 @@ class BinanceAPIManager:
         from_coin_price = from_coin_price or self.get_all_market_tickers().get_price(origin_symbol + target_symbol)
 
         origin_tick = self.get_alt_tick(origin_symbol, target_symbol)
-        return math.floor(target_balance * 10 ** origin_tick / from_coin_price) / float(10 ** origin_tick)
+        return math.floor(target_balance * 10**origin_tick / from_coin_price) / float(10**origin_tick)
 
     def _buy_alt(self, origin_coin: Coin, target_coin: Coin, all_tickers):
         """
@@ -222,6 +392,7 @@ class BinanceAPIManager:
         origin_symbol = origin_coin.symbol
         target_symbol = target_coin.symbol
 
+        self.invalidate_account_snapshot()
         origin_balance = self.get_currency_balance(origin_symbol)
         target_balance = self.get_currency_balance(target_symbol)
         from_coin_price = all_tickers.get_price(origin_symbol + target_symbol)
@@ -229,25 +400,20 @@ class BinanceAPIManager:
         order_quantity = self._buy_quantity(origin_symbol, target_symbol, target_balance, from_coin_price)
         self.logger.info(f"BUY QTY {order_quantity} of <{origin_symbol}>")
 
-        # Try to buy until successful
-        order = None
-        while order is None:
-            try:
-                order = self.binance_client.order_limit_buy(
-                    symbol=origin_symbol + target_symbol,
-                    quantity=order_quantity,
-                    price=from_coin_price,
-                )
-                self.logger.info(order)
-            except BinanceAPIException as e:
-                self.logger.info(e)
-                time.sleep(1)
-            except Exception as e:  # pylint: disable=broad-except
-                self.logger.info(f"Unexpected Error: {e}")
+        order = self._place_order(
+            self.binance_client.order_limit_buy,
+            symbol=origin_symbol + target_symbol,
+            quantity=order_quantity,
+            price=from_coin_price,
+        )
+        if order is None:
+            return None
+        self.logger.info(order)
 
         trade_log.set_ordered(origin_balance, target_balance, order_quantity)
 
         stat = self.wait_for_order(origin_symbol, target_symbol, order["orderId"])
+        self.invalidate_account_snapshot()
 
         if stat is None:
             return None
@@ -264,7 +430,7 @@ class BinanceAPIManager:
         origin_balance = origin_balance or self.get_currency_balance(origin_symbol)
 
         origin_tick = self.get_alt_tick(origin_symbol, target_symbol)
-        return math.floor(origin_balance * 10 ** origin_tick) / float(10 ** origin_tick)
+        return math.floor(origin_balance * 10**origin_tick) / float(10**origin_tick)
 
     def _sell_alt(self, origin_coin: Coin, target_coin: Coin, all_tickers: AllTickers):
         """
@@ -274,6 +440,7 @@ class BinanceAPIManager:
         origin_symbol = origin_coin.symbol
         target_symbol = target_coin.symbol
 
+        self.invalidate_account_snapshot()
         origin_balance = self.get_currency_balance(origin_symbol)
         target_balance = self.get_currency_balance(target_symbol)
         from_coin_price = all_tickers.get_price(origin_symbol + target_symbol)
@@ -282,12 +449,15 @@ class BinanceAPIManager:
         self.logger.info(f"Selling {order_quantity} of {origin_symbol}")
 
         self.logger.info(f"Balance is {origin_balance}")
-        order = None
-        while order is None:
-            # Should sell at calculated price to avoid lost coin
-            order = self.binance_client.order_limit_sell(
-                symbol=origin_symbol + target_symbol, quantity=(order_quantity), price=from_coin_price
-            )
+        # Should sell at calculated price to avoid lost coin
+        order = self._place_order(
+            self.binance_client.order_limit_sell,
+            symbol=origin_symbol + target_symbol,
+            quantity=order_quantity,
+            price=from_coin_price,
+        )
+        if order is None:
+            return None
 
         self.logger.info("order")
         self.logger.info(order)
@@ -298,13 +468,12 @@ class BinanceAPIManager:
         self.logger.info("Waiting for Binance")
 
         stat = self.wait_for_order(origin_symbol, target_symbol, order["orderId"])
+        self.invalidate_account_snapshot()
 
         if stat is None:
             return None
 
-        new_balance = self.get_currency_balance(origin_symbol)
-        while new_balance >= origin_balance:
-            new_balance = self.get_currency_balance(origin_symbol)
+        self.wait_for_balance_settlement(origin_symbol, origin_balance, stat)
 
         self.logger.info(f"Sold {origin_symbol}")
 
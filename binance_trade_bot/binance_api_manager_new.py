@@ -1,6 +1,7 @@
 import math
 import time
 import traceback
+from typing import Callable, Set
 
 from twisted.internet import reactor
 
@@ -8,12 +9,13 @@ from binance.exceptions import BinanceAPIException
 from binance.websockets import BinanceSocketManager
 from cachetools import TTLCache, cached
 
-from binance_trade_bot.binance_api.binance_client_new import BinanceClientNew
-from binance_trade_bot.binance_api_manager import AllTickers, BinanceAPIManager
+from binance_trade_bot.binance_api_manager import AllTickers, BinanceAPIManager, FeeTable
+from binance_trade_bot.binance_client_new import BinanceClientNew
 from binance_trade_bot.config_new import ConfigNew
 from binance_trade_bot.database import Database
 from binance_trade_bot.logger import Logger
 from binance_trade_bot.models import Coin
+from binance_trade_bot.symbol_info import SymbolInfoStore
 
 
 class BinanceAPIManagerNew(BinanceAPIManager):
@@ -21,9 +23,12 @@ class BinanceAPIManagerNew(BinanceAPIManager):
         self.db = db
         self.logger = logger
         self.config = config
+        self.account_snapshot = None
+        self.fee_table = None
         api_key = self.config.BINANCE_API_KEY
         api_secret = self.config.BINANCE_API_SECRET_KEY
         self.binance_client = BinanceClientNew(api_key, api_secret, config, logger)
+        self.symbol_info = SymbolInfoStore(self.binance_client, logger)
         if self.binance_client.is_client_ok:
             self.socket_manager = BinanceSocketManager(self.binance_client)
             self.binance_client.socket_manager = self.socket_manager
@@ -36,7 +41,64 @@ class BinanceAPIManagerNew(BinanceAPIManager):
         conn_key = self.binance_client.start_user_socket()
         return conn_key
 
+    def start_ticker_stream(self, listener: Callable[[Set[str]], None]):
+        """
+        Receive the ticker stream in this process, calling listener with the symbols whose price changed
+        """
+        self.binance_client.save_ticker_data = False
+        self.binance_client.ticker_listeners.append(listener)
+        conn_key = self.start_multiplex_socket()
+        self.start_sock_manager()
+        return conn_key
+
+    def start_user_stream(self):
+        """
+        Receive the user data stream in this process, keeping the balance ledger up to date
+        """
+        self.binance_client.save_user_data = False
+        conn_key = self.start_user_socket()
+        self.start_sock_manager()
+        self.reconcile_balances()
+        return conn_key
+
+    def reconcile_balances(self):
+        out_of_sync = self.binance_client.reconcile_balances()
+        if out_of_sync:
+            self.logger.info(f"Balance ledger was out of sync for {', '.join(out_of_sync)}", notification=False)
+
+    def _get_order_status(self, origin_symbol: str, target_symbol: str, order_id):
+        order_status = self.binance_client.order_tracker.get(order_id)
+        if order_status is not None:
+            return order_status
+        return super()._get_order_status(origin_symbol, target_symbol, order_id)
+
+    def _wait_for_order_status(self, origin_symbol: str, target_symbol: str, order_status):
+        """
+        Wait for the user stream to push an update of the order, only polling the REST API if none
+        arrived for order_poll_interval seconds
+        """
+        if self.binance_client.save_user_data:
+            # the user socket runs in the websocket reader, which only shares order updates through files
+            return super()._wait_for_order_status(origin_symbol, target_symbol, order_status)
+
+        last_update_time = order_status.get("updateTime", order_status["time"])
+        new_order_status = self.binance_client.order_tracker.wait(
+            order_status["orderId"], last_update_time, self.config.ORDER_POLL_INTERVAL
+        )
+        if new_order_status is not None:
+            return new_order_status
+        return self.binance_client.get_order(symbol=origin_symbol + target_symbol, orderId=order_status["orderId"])
+
+    def _wait_for_balance_update(self, timeout: float):
+        if self.binance_client.save_user_data:
+            super()._wait_for_balance_update(timeout)
+            return
+        # the balance ledger is updated by the user socket of this process, wake up as soon as it is
+        self.binance_client.balance_ledger.wait_for_update(timeout)
+
     def start_sock_manager(self):
+        if self.socket_manager.is_alive():
+            return
         self.socket_manager.start()
         self.logger.info("BinanceSocketManager started")
 
@@ -55,15 +117,16 @@ class BinanceAPIManagerNew(BinanceAPIManager):
         Get ticker price of all coins
         """
         # return super().get_all_market_tickers()
-        return AllTickers(self.binance_client.get_all_tickers())
+        all_tickers = AllTickers(self.binance_client.get_all_tickers())
+        self.fee_table = FeeTable(self, all_tickers)
+        return all_tickers
 
     def get_all_balances(self):
         try:
             account_info = self.binance_client.get_account()
         except BinanceAPIException as e:
             self.logger.error(f"Error in get_all_balances(): {e}")
-            if e.code == -1003:
-                pass
+            self._warn_if_rate_limited(e)
             return None
 
         return account_info["balances"]
@@ -73,18 +136,12 @@ class BinanceAPIManagerNew(BinanceAPIManager):
         Get balance of a specific coin
         """
         try:
-            account_info = self.binance_client.get_account()
+            return super().get_currency_balance(currency_symbol)
         except BinanceAPIException as e:
             self.logger.error(f"Error in get_currency_balance(): {e}")
-            if e.code == -1003:
-                pass
+            self._warn_if_rate_limited(e)
             return None
 
-        for currency_balance in account_info["balances"]:
-            if currency_balance["asset"] == currency_symbol:
-                return float(currency_balance["free"])
-        return None
-
     def get_market_ticker_price(self, ticker_symbol: str):
         """
         Get ticker price of a specific coin
@@ -0,0 +1,112 @@
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from binance.client import Client
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from requests.exceptions import ConnectTimeout, RequestException
+
+from .rate_limiter import ORDER, RateLimiter, get_endpoint_limits
+from .transport import LatencyStats, PooledHTTPAdapter, get_backoff_delay
+
+CONNECT_TIMEOUT = 3.05
+
+
+class BinanceClient(Client):
+    """
+    Binance REST client sending the calls to the /api endpoints through a RateLimiter, and keeping it
+    in sync with the used weight headers of every response.
+
+    The /sapi and /wapi endpoints have separate limits and are sent right away.
+
+    Connections are kept alive in a pool, failed calls are retried with backoff when that is safe,
+    and the latency of every call is recorded in `latency_stats`.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        api_key,
+        api_secret,
+        tld="com",
+        rate_limiter: RateLimiter = None,
+        pool_size=10,
+        timeout=10.0,
+        order_timeout=5.0,
+        retries=3,
+    ):
+        # The constructor of Client already sends requests
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.latency_stats = LatencyStats()
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.order_timeout = order_timeout
+        self.retries = retries
+        super().__init__(api_key, api_secret, tld=tld)
+
+    def _init_session(self):
+        session = super()._init_session()
+        session.mount("https://", PooledHTTPAdapter(self.pool_size, self._get_timeout))
+        return session
+
+    def _get_api_endpoint(self, uri: str) -> Optional[str]:
+        # uri is API_URL/<version>/<endpoint> for the /api endpoints
+        api_prefix = self.API_URL + "/"
+        if not uri.startswith(api_prefix):
+            return None
+        return uri[len(api_prefix) :].split("?", 1)[0].split("/", 1)[1]
+
+    def _get_timeout(self, method: str, url: str) -> Tuple[float, float]:
+        endpoint = self._get_api_endpoint(url)
+        if endpoint is not None and get_endpoint_limits(method.lower(), endpoint, True)[0] == ORDER:
+            return CONNECT_TIMEOUT, self.order_timeout
+        return CONNECT_TIMEOUT, self.timeout
+
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        endpoint = self._get_api_endpoint(uri)
+        if endpoint is not None:
+            data = kwargs.get("data") or {}
+            priority, weight = get_endpoint_limits(method, endpoint, "symbol" in data)
+        placing_order = (method, endpoint) == ("post", "order")
+        stats_key = f"{method.upper()} {endpoint or urlparse(uri).path}"
+
+        for attempt in range(self.retries + 1):
+            if endpoint is not None:
+                self.rate_limiter.acquire(priority, weight, order=placing_order)
+
+            start_time = time.monotonic()
+            self.response = None
+            try:
+                # The request data is signed and reordered in place, every attempt starts from a copy
+                return super()._request(method, uri, signed, force_params, **_copy_request_kwargs(kwargs))
+            except (RequestException, BinanceAPIException, BinanceRequestException) as e:
+                if attempt == self.retries or not _is_retryable(e, placing_order):
+                    raise
+            finally:
+                self.latency_stats.record(stats_key, time.monotonic() - start_time)
+                if self.response is not None:
+                    self.rate_limiter.update(self.response.status_code, self.response.headers)
+
+            time.sleep(get_backoff_delay(attempt))
+        return None
+
+    def get_latency_percentiles(self):
+        return self.latency_stats.get_percentiles()
+
+
+def _copy_request_kwargs(kwargs):
+    data = kwargs.get("data")
+    if isinstance(data, dict):
+        return {**kwargs, "data": dict(data)}
+    return dict(kwargs)
+
+
+def _is_retryable(e: Exception, placing_order: bool):
+    if isinstance(e, ConnectTimeout):
+        # The request never reached Binance
+        return True
+    if placing_order:
+        # Binance may have placed the order anyway, sending it again could place it twice
+        return False
+    if isinstance(e, BinanceAPIException):
+        return e.status_code == 429 or e.status_code >= 500
+    return True
@@ -4,17 +4,27 @@ import os
 import pathlib
 import pickle
 import time
+from typing import Callable, List, Set
 
-from binance.client import Client
-
+from binance_trade_bot.balance_ledger import BalanceLedger
+from binance_trade_bot.binance_client import BinanceClient
 from binance_trade_bot.config import Config
 from binance_trade_bot.logger import Logger
+from binance_trade_bot.order_tracker import OrderTracker
 
 
-class BinanceClientNew(Client):
+class BinanceClientNew(BinanceClient):
     def __init__(self, api_key, api_secret, config: Config, logger: Logger):
         try:
-            super().__init__(api_key, api_secret, tld=config.BINANCE_TLD)
+            super().__init__(
+                api_key,
+                api_secret,
+                tld=config.BINANCE_TLD,
+                pool_size=config.HTTP_POOL_SIZE,
+                timeout=config.HTTP_TIMEOUT,
+                order_timeout=config.ORDER_HTTP_TIMEOUT,
+                retries=config.HTTP_RETRIES,
+            )
             self.is_client_ok = True
         except Exception as e:    # pylint: disable=broad-except
             self.is_client_ok = False
@@ -25,6 +35,15 @@ class BinanceClientNew(Client):
         self.multiplex_socket_conn_key = None
         self.user_socket_conn_key = None
         self.all_ticker_dict = {}
+        # Called with the set of symbols whose price changed, for every ticker message received
+        self.ticker_listeners: List[Callable[[Set[str]], None]] = []
+        # The websocket reader shares ticker data with the trader through files, a trader that
+        # runs its own ticker socket reads it from memory instead
+        self.save_ticker_data = True
+        # Same for the user data stream, whose account updates are kept in the balance ledger
+        self.save_user_data = True
+        self.balance_ledger = BalanceLedger()
+        self.order_tracker = OrderTracker()
 
     def start_multiplex_socket(self):
         streams_names = ["!ticker@arr"]
@@ -112,6 +131,7 @@ class BinanceClientNew(Client):
                 self.logger.info(f"Exception occurred: {e}")
 
     def _process_ticker_msg(self, data_list):
+        changed_symbols = set()
         for tick_info in data_list:
             ticker_time = tick_info["E"]
             ticker_symbol = tick_info["s"]
@@ -119,11 +139,19 @@ class BinanceClientNew(Client):
             ticker = {"time": ticker_time, "symbol": ticker_symbol, "price": ticker_price}
             if ticker_symbol not in self.all_ticker_dict or \
                self.all_ticker_dict[ticker_symbol]["time"] < ticker_time:
+                if ticker_symbol not in self.all_ticker_dict or \
+                   self.all_ticker_dict[ticker_symbol]["price"] != ticker_price:
+                    changed_symbols.add(ticker_symbol)
                 self.all_ticker_dict[ticker_symbol] = ticker
 
-        file_dir = os.path.join(self.config.RAMDISK_DIR, 'ticker')
-        data = list(self.all_ticker_dict.values())
-        current_file_time = self._save_data(file_dir, data)
+        if self.save_ticker_data:
+            file_dir = os.path.join(self.config.RAMDISK_DIR, 'ticker')
+            data = list(self.all_ticker_dict.values())
+            current_file_time = self._save_data(file_dir, data)
+
+        if changed_symbols:
+            for listener in self.ticker_listeners:
+                listener(changed_symbols)
 
     def _process_other_msg(self, data_dict):
         pass
@@ -136,14 +164,17 @@ class BinanceClientNew(Client):
                         'price': data_dict['p'],
                         'status': data_dict['X'],
                         'execType': data_dict['x'],
-                        'cummulativeQuoteQty': data_dict['Q']
+                        'cummulativeQuoteQty': data_dict['Z'],
+                        'executedQty': data_dict['z']
                         }
 
-        file_dir = os.path.join(self.config.RAMDISK_DIR, 'order')
-        prefix = f"{order_status['symbol']}_{order_status['orderId']}"
-        timestamp = order_status['time']
-        data = order_status
-        current_file_time = self._save_data(file_dir, data, timestamp, prefix)
+        self.order_tracker.update(order_status)
+        if self.save_user_data:
+            file_dir = os.path.join(self.config.RAMDISK_DIR, 'order')
+            prefix = f"{order_status['symbol']}_{order_status['orderId']}"
+            timestamp = order_status['time']
+            data = order_status
+            current_file_time = self._save_data(file_dir, data, timestamp, prefix)
         self.logger.info(f"order message received: {order_status}")
 
     def _save_account_msg(self, account_info):
@@ -167,7 +198,9 @@ class BinanceClientNew(Client):
                             }
             account_info['balances'].append(balance_info)
 
-        self._save_account_msg(account_info)
+        self.balance_ledger.apply_account_position(account_info['time'], account_info['balances'])
+        if self.save_user_data:
+            self._save_account_msg(account_info)
 
     def process_multiplex_msg(self, msg):
         if "stream" not in msg:
@@ -269,6 +302,10 @@ class BinanceClientNew(Client):
 
     # override parent class's get_all_tickers() function
     def get_all_tickers(self):
+        # the ticker socket runs in this process, no need to go through the ramdisk files
+        if not self.save_ticker_data and self.all_ticker_dict:
+            return list(self.all_ticker_dict.values())
+
         file_dir = os.path.join(self.config.RAMDISK_DIR, 'ticker')
         latest_file_name = self._get_latest_file_name(file_dir)
         if latest_file_name is None:
@@ -299,6 +336,11 @@ class BinanceClientNew(Client):
 
     # override parent class's get_order() function
     def get_order(self, **params):
+        # the user socket runs in this process, orders aren't saved to the ramdisk, and orders looked
+        # up by client order id can't be found there
+        if not self.save_user_data or "orderId" not in params:
+            return super().get_order(**params)
+
         file_dir = os.path.join(self.config.RAMDISK_DIR, 'order')
         prefix = f"{params['symbol']}_{params['orderId']}"
         latest_file_name = self._get_latest_file_name(file_dir, prefix)
@@ -312,6 +354,12 @@ class BinanceClientNew(Client):
 
     # override parent class's get_account() function
     def get_account(self, **params):
+        # the user socket runs in this process, answer from the balance ledger while it's fresh
+        if not self.save_user_data:
+            if not self.balance_ledger.is_fresh(self.config.BALANCE_MAX_AGE):
+                self.reconcile_balances(**params)
+            return self.balance_ledger.get_account()
+
         file_dir = os.path.join(self.config.RAMDISK_DIR, 'account')
         latest_file_name = self._get_latest_file_name(file_dir)
         if latest_file_name is None:
@@ -321,3 +369,7 @@ class BinanceClientNew(Client):
             return account_info
 
         return self._load_data(latest_file_name)
+
+    def reconcile_balances(self, **params):
+        account_info = super().get_account(**params)
+        return self.balance_ledger.reconcile(account_info)
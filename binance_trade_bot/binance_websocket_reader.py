@@ -27,6 +27,9 @@ def main():
 
     db = Database(logger, config)
     manager = BinanceAPIManagerNew(config, db, logger)
+    # Save the trading rules of all symbols to disk for the trader
+    manager.symbol_info.load()
+    schedule.every(1).hours.do(manager.symbol_info.load).tag("refreshing symbol info")
 
     try:
         conn_key = manager.start_multiplex_socket()
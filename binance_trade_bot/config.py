@@ -21,6 +21,16 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
             "strategy": "default",
             "sell_timeout": "0",
             "buy_timeout": "0",
+            "http_pool_size": "10",
+            "http_timeout": "10",
+            "order_http_timeout": "5",
+            "http_retries": "3",
+            "sqlite_journal_mode": "WAL",
+            "sqlite_synchronous": "NORMAL",
+            "sqlite_mmap_size": "268435456",
+            "sqlite_cache_size": "-16000",
+            "sqlite_busy_timeout": "5000",
+            "sqlite_pool_size": "5",
         }
 
         if not os.path.exists(CFG_FL_NAME):
@@ -70,3 +80,31 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
 
         self.SELL_TIMEOUT = os.environ.get("SELL_TIMEOUT") or config.get(USER_CFG_SECTION, "sell_timeout")
         self.BUY_TIMEOUT = os.environ.get("BUY_TIMEOUT") or config.get(USER_CFG_SECTION, "buy_timeout")
+
+        # Get config for the REST transport
+        self.HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE") or config.get(USER_CFG_SECTION, "http_pool_size"))
+        self.HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT") or config.get(USER_CFG_SECTION, "http_timeout"))
+        self.ORDER_HTTP_TIMEOUT = float(
+            os.environ.get("ORDER_HTTP_TIMEOUT") or config.get(USER_CFG_SECTION, "order_http_timeout")
+        )
+        self.HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES") or config.get(USER_CFG_SECTION, "http_retries"))
+
+        # Get config for the SQLite database, applied on every connection
+        self.SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE") or config.get(
+            USER_CFG_SECTION, "sqlite_journal_mode"
+        )
+        self.SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS") or config.get(
+            USER_CFG_SECTION, "sqlite_synchronous"
+        )
+        self.SQLITE_MMAP_SIZE = int(
+            os.environ.get("SQLITE_MMAP_SIZE") or config.get(USER_CFG_SECTION, "sqlite_mmap_size")
+        )
+        self.SQLITE_CACHE_SIZE = int(
+            os.environ.get("SQLITE_CACHE_SIZE") or config.get(USER_CFG_SECTION, "sqlite_cache_size")
+        )
+        self.SQLITE_BUSY_TIMEOUT = int(
+            os.environ.get("SQLITE_BUSY_TIMEOUT") or config.get(USER_CFG_SECTION, "sqlite_busy_timeout")
+        )
+        self.SQLITE_POOL_SIZE = int(
+            os.environ.get("SQLITE_POOL_SIZE") or config.get(USER_CFG_SECTION, "sqlite_pool_size")
+        )
@@ -17,3 +17,36 @@ class ConfigNew(Config):  # pylint: disable=too-few-public-methods,too-many-inst
 
     def set_websocket_config(self, config):
         self.RAMDISK_DIR = os.environ.get("RAMDISK_DIR") or config.get(WEBSOCKET_CFG_SECTION, "ramdisk_dir")
+
+        # "polling" scouts every scout_sleep_time seconds, "event" scouts when the ticker socket
+        # reports a price change of one of the coins
+        self.SCOUT_MODE = os.environ.get("SCOUT_MODE") or config.get(
+            WEBSOCKET_CFG_SECTION, "scout_mode", fallback="polling"
+        )
+        self.SCOUT_DEBOUNCE = float(
+            os.environ.get("SCOUT_DEBOUNCE") or config.get(WEBSOCKET_CFG_SECTION, "scout_debounce", fallback="0.2")
+        )
+        self.SCOUT_MIN_INTERVAL = float(
+            os.environ.get("SCOUT_MIN_INTERVAL")
+            or config.get(WEBSOCKET_CFG_SECTION, "scout_min_interval", fallback="1")
+        )
+
+        # Keep the balances in memory from the user data stream received by the trader itself, and
+        # fall back to the REST API once they weren't confirmed for balance_max_age seconds
+        self.BALANCE_LEDGER = (
+            os.environ.get("BALANCE_LEDGER") or config.get(WEBSOCKET_CFG_SECTION, "balance_ledger", fallback="false")
+        ).lower() in ("true", "1", "yes")
+        self.BALANCE_MAX_AGE = float(
+            os.environ.get("BALANCE_MAX_AGE") or config.get(WEBSOCKET_CFG_SECTION, "balance_max_age", fallback="120")
+        )
+        self.BALANCE_RECONCILE_INTERVAL = int(
+            os.environ.get("BALANCE_RECONCILE_INTERVAL")
+            or config.get(WEBSOCKET_CFG_SECTION, "balance_reconcile_interval", fallback="60")
+        )
+
+        # With the user data stream in this process, order fills are pushed by the stream, the REST
+        # API is only polled if no update arrived for order_poll_interval seconds
+        self.ORDER_POLL_INTERVAL = float(
+            os.environ.get("ORDER_POLL_INTERVAL")
+            or config.get(WEBSOCKET_CFG_SECTION, "order_poll_interval", fallback="10")
+        )
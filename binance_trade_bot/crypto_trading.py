@@ -14,7 +14,7 @@ def main():
     logger.info("Starting")
 
     config = Config()
-    db = Database(logger, config)
+    db = Database(logger, config, cache=True)
     manager = BinanceAPIManager(config, db, logger)
     # check if we can access API feature that require valid config
     try:
@@ -43,6 +43,7 @@ def main():
     schedule.every(1).minutes.do(trader.update_values).tag("updating value history")
     schedule.every(1).minutes.do(db.prune_scout_history).tag("pruning scout history")
     schedule.every(1).hours.do(db.prune_value_history).tag("pruning value history")
+    schedule.every(10).minutes.do(manager.log_latency_stats).tag("logging request latency")
 
     while True:
         schedule.run_pending()
@@ -1,12 +1,14 @@
 import os
 import signal
 import time
+from traceback import format_exc
 
 from .binance_api_manager_new import BinanceAPIManagerNew
 from .config_new import ConfigNew
 from .database import Database
 from .logger import Logger
 from .scheduler import SafeScheduler
+from .scout_trigger import ScoutTrigger
 from .strategies import get_strategy
 
 
@@ -15,7 +17,7 @@ def main():
     logger.info("Starting")
 
     config = ConfigNew()
-    db = Database(logger, config)
+    db = Database(logger, config, cache=True)
     manager = BinanceAPIManagerNew(config, db, logger)
     strategy = get_strategy(config.STRATEGY)
     if strategy is None:
@@ -30,21 +32,57 @@ def main():
     db.set_coins(config.SUPPORTED_COIN_LIST)
     db.migrate_old_state()
 
+    if config.BALANCE_LEDGER:
+        conn_key = manager.start_user_stream()
+        logger.info(f"Balance ledger started, conn_key='{conn_key}'")
+
     trader.initialize()
 
     schedule = SafeScheduler(logger)
-    schedule.every(config.SCOUT_SLEEP_TIME).seconds.do(trader.scout).tag("scouting")
+    if config.SCOUT_MODE != "event":
+        schedule.every(config.SCOUT_SLEEP_TIME).seconds.do(trader.scout).tag("scouting")
     schedule.every(1).minutes.do(trader.update_values).tag("updating value history")
     schedule.every(1).minutes.do(db.prune_scout_history).tag("pruning scout history")
     schedule.every(1).hours.do(db.prune_value_history).tag("pruning value history")
+    schedule.every(10).minutes.do(manager.log_latency_stats).tag("logging request latency")
+    if config.BALANCE_LEDGER:
+        schedule.every(config.BALANCE_RECONCILE_INTERVAL).seconds.do(manager.reconcile_balances).tag(
+            "reconciling balances"
+        )
 
     try:
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        if config.SCOUT_MODE == "event":
+            run_event_driven(logger, config, db, manager, trader, schedule)
+        else:
+            while True:
+                schedule.run_pending()
+                time.sleep(1)
     except SystemExit as se:
         logger.info(f"SystemExit occurred: {se}")
     except Exception as e:  # pylint: disable=broad-except
         logger.info(f"Exception occurred: {e}")
     finally:
         os._exit(0)
+
+
+def run_event_driven(logger, config, db, manager, trader, schedule):
+    """
+    Scout whenever the ticker socket reports a new price for one of the coins (the held coin is one
+    of them), instead of every scout_sleep_time seconds
+    """
+    trigger = ScoutTrigger(config.SCOUT_DEBOUNCE, config.SCOUT_MIN_INTERVAL)
+    trigger.watch(coin + config.BRIDGE for coin in db.get_coins())
+
+    conn_key = manager.start_ticker_stream(trigger.on_ticker_update)
+    logger.info(f"Event driven scouting started, conn_key='{conn_key}'")
+
+    try:
+        while True:
+            if trigger.wait(timeout=1):
+                try:
+                    trader.scout()
+                except Exception:  # pylint: disable=broad-except
+                    logger.error(f"Error while scouting...\n{format_exc()}")
+            schedule.run_pending()
+    finally:
+        manager.stop_sock_manager()
@@ -3,37 +3,68 @@ import os
 import time
 from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
-from socketio import Client
-from socketio.exceptions import ConnectionError as SocketIOConnectionError
-from sqlalchemy import create_engine, func
+from sqlalchemy import and_, create_engine, event, func, inspect, select
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
 from .config import Config
 from .logger import Logger
-from .models import *  # pylint: disable=wildcard-import
+from .model_cache import ModelCache
+from .models import Base, Coin, CoinValue, CurrentCoin, Interval, Pair, ScoutHistory, Trade, TradeState
+from .scout_history_writer import ScoutHistoryWriter
+from .update_publisher import UpdatePublisher
+from .value_rollups import backfill_value_rollups
 
 
 class Database:
-    def __init__(self, logger: Logger, config: Config, uri="sqlite:///data/crypto_trading.db"):
+    def __init__(self, logger: Logger, config: Config, uri="sqlite:///data/crypto_trading.db", cache=False):
         self.logger = logger
         self.config = config
-        self.engine = create_engine(uri)
+        # Only the process that writes the coins, pairs and current coin may keep them in memory
+        self.cache_enabled = cache
+        self.model_cache: Optional[ModelCache] = None
+        # Time of the last prune of the value history, the next one only looks at the entries since. Taken
+        # from the entries marked by the previous prunes after a restart
+        self.value_history_watermark: Optional[datetime] = None
+        self.engine = self._create_engine(uri)
         self.SessionMaker = sessionmaker(bind=self.engine)
-        self.socketio_client = Client()
-
-    def socketio_connect(self):
-        if self.socketio_client.connected and self.socketio_client.namespaces:
-            return True
-        try:
-            if not self.socketio_client.connected:
-                self.socketio_client.connect("http://api:5123", namespaces=["/backend"])
-            while not self.socketio_client.connected or not self.socketio_client.namespaces:
-                time.sleep(0.1)
-            return True
-        except SocketIOConnectionError:
-            return False
+        self.update_publisher = UpdatePublisher(logger)
+        # Started by the first scout logged, processes that don't scout don't need it
+        self.scout_history_writer: Optional[ScoutHistoryWriter] = None
+
+    def _create_engine(self, uri: str):
+        url = make_url(uri)
+        if url.get_backend_name() != "sqlite":
+            return create_engine(uri)
+
+        # The scout history is written from a background thread, and the api server answers from
+        # several, so connections are shared between threads
+        connect_args = {"check_same_thread": False, "timeout": self.config.SQLITE_BUSY_TIMEOUT / 1000}
+        if url.database in (None, "", ":memory:"):
+            # An in-memory database only exists in the connection that created it
+            engine = create_engine(uri, connect_args=connect_args, poolclass=StaticPool)
+        else:
+            engine = create_engine(
+                uri, connect_args=connect_args, poolclass=QueuePool, pool_size=self.config.SQLITE_POOL_SIZE
+            )
+            event.listen(engine, "connect", self._set_sqlite_pragmas)
+        return engine
+
+    def _set_sqlite_pragmas(self, dbapi_connection, _connection_record):
+        """
+        With WAL journaling, the api server reads the database while the bot writes to it instead of
+        waiting for the write to finish, and synchronous=NORMAL only syncs to disk on checkpoints
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={self.config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={self.config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={self.config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={self.config.SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={self.config.SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
 
     @contextmanager
     def db_session(self):
@@ -48,35 +79,58 @@ class Database:
     def set_coins(self, symbols: List[str]):
         session: Session
 
-        # Add coins to the database and set them as enabled or not
-        with self.db_session() as session:
-            # For all the coins in the database, if the symbol no longer appears
-            # in the config file, set the coin as disabled
-            coins: List[Coin] = session.query(Coin).all()
-            for coin in coins:
-                if coin.symbol not in symbols:
-                    coin.enabled = False
-
-            # For all the symbols in the config file, add them to the database
-            # if they don't exist
-            for symbol in symbols:
-                coin = next((coin for coin in coins if coin.symbol == symbol), None)
-                if coin is None:
-                    session.add(Coin(symbol))
-                else:
-                    coin.enabled = True
-
-        # For all the combinations of coins in the database, add a pair to the database
         with self.db_session() as session:
-            coins: List[Coin] = session.query(Coin).filter(Coin.enabled).all()
-            for from_coin in coins:
-                for to_coin in coins:
-                    if from_coin != to_coin:
-                        pair = session.query(Pair).filter(Pair.from_coin == from_coin, Pair.to_coin == to_coin).first()
-                        if pair is None:
-                            session.add(Pair(from_coin, to_coin))
+            # Set the coins as enabled or not depending on whether their symbol appears in the config
+            # file, and add the ones that don't exist yet
+            session.query(Coin).update({Coin.enabled: Coin.symbol.in_(symbols)}, synchronize_session=False)
+            existing_symbols = {symbol for (symbol,) in session.query(Coin.symbol)}
+            new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in existing_symbols]
+            if new_symbols:
+                session.bulk_insert_mappings(Coin, [{"symbol": symbol, "enabled": True} for symbol in new_symbols])
+
+            # For all the combinations of enabled coins, add a pair to the database if it doesn't exist
+            enabled_symbols = [symbol for (symbol,) in session.query(Coin.symbol).filter(Coin.enabled)]
+            existing_pairs = set(session.query(Pair.from_coin_id, Pair.to_coin_id))
+            new_pairs = [
+                {"from_coin_id": from_symbol, "to_coin_id": to_symbol, "enabled": True}
+                for from_symbol in enabled_symbols
+                for to_symbol in enabled_symbols
+                if from_symbol != to_symbol and (from_symbol, to_symbol) not in existing_pairs
+            ]
+            if new_pairs:
+                session.bulk_insert_mappings(Pair, new_pairs)
+            self._update_pairs_enabled(session)
+
+        self.model_cache = None
+
+    @staticmethod
+    def _update_pairs_enabled(session: Session):
+        """
+        Set every pair as enabled if both of its coins are, in a single statement
+        """
+        enabled_coins = select([Coin.symbol]).where(Coin.enabled.is_(True))
+        session.query(Pair).update(
+            {Pair.enabled: and_(Pair.from_coin_id.in_(enabled_coins), Pair.to_coin_id.in_(enabled_coins))},
+            synchronize_session=False,
+        )
+
+    def _get_model_cache(self) -> Optional[ModelCache]:
+        """
+        Get the in-memory coins and pairs, loading them if needed, or None if the cache is disabled
+        """
+        if not self.cache_enabled:
+            return None
+        if self.model_cache is None:
+            session: Session
+            with self.db_session() as session:
+                self.model_cache = ModelCache(session)
+        return self.model_cache
 
     def get_coins(self, only_enabled=True) -> List[Coin]:
+        model_cache = self._get_model_cache()
+        if model_cache is not None:
+            return [coin for coin in model_cache.coins.values() if coin.enabled or not only_enabled]
+
         session: Session
         with self.db_session() as session:
             if only_enabled:
@@ -89,6 +143,10 @@ class Database:
     def get_coin(self, coin: Union[Coin, str]) -> Coin:
         if isinstance(coin, Coin):
             return coin
+        model_cache = self._get_model_cache()
+        if model_cache is not None:
+            return model_cache.coins.get(coin)
+
         session: Session
         with self.db_session() as session:
             coin = session.query(Coin).get(coin)
@@ -104,8 +162,16 @@ class Database:
             cc = CurrentCoin(coin)
             session.add(cc)
             self.send_update(cc)
+            symbol = coin.symbol
+
+        if self.model_cache is not None:
+            self.model_cache.current_coin = self.model_cache.coins.get(symbol)
 
     def get_current_coin(self) -> Optional[Coin]:
+        model_cache = self._get_model_cache()
+        if model_cache is not None:
+            return model_cache.current_coin
+
         session: Session
         with self.db_session() as session:
             current_coin = session.query(CurrentCoin).order_by(CurrentCoin.datetime.desc()).first()
@@ -118,6 +184,10 @@ class Database:
     def get_pair(self, from_coin: Union[Coin, str], to_coin: Union[Coin, str]):
         from_coin = self.get_coin(from_coin)
         to_coin = self.get_coin(to_coin)
+        model_cache = self._get_model_cache()
+        if model_cache is not None:
+            return model_cache.pairs.get((from_coin.symbol, to_coin.symbol))
+
         session: Session
         with self.db_session() as session:
             pair: Pair = session.query(Pair).filter(Pair.from_coin == from_coin, Pair.to_coin == to_coin).first()
@@ -126,6 +196,11 @@ class Database:
 
     def get_pairs_from(self, from_coin: Union[Coin, str], only_enabled=True) -> List[Pair]:
         from_coin = self.get_coin(from_coin)
+        model_cache = self._get_model_cache()
+        if model_cache is not None:
+            pairs = model_cache.pairs_from.get(from_coin.symbol, [])
+            return [pair for pair in pairs if pair.enabled or not only_enabled]
+
         session: Session
         with self.db_session() as session:
             pairs = session.query(Pair).filter(Pair.from_coin == from_coin)
@@ -135,7 +210,27 @@ class Database:
             session.expunge_all()
             return pairs
 
+    def get_pairs_to(self, to_coin: Union[Coin, str], only_enabled=True) -> List[Pair]:
+        to_coin = self.get_coin(to_coin)
+        model_cache = self._get_model_cache()
+        if model_cache is not None:
+            pairs = model_cache.pairs_to.get(to_coin.symbol, [])
+            return [pair for pair in pairs if pair.enabled or not only_enabled]
+
+        session: Session
+        with self.db_session() as session:
+            pairs = session.query(Pair).filter(Pair.to_coin == to_coin)
+            if only_enabled:
+                pairs = pairs.filter(Pair.enabled.is_(True))
+            pairs = pairs.all()
+            session.expunge_all()
+            return pairs
+
     def get_pairs(self, only_enabled=True) -> List[Pair]:
+        model_cache = self._get_model_cache()
+        if model_cache is not None:
+            return [pair for pair in model_cache.pairs.values() if pair.enabled or not only_enabled]
+
         session: Session
         with self.db_session() as session:
             pairs = session.query(Pair)
@@ -145,6 +240,18 @@ class Database:
             session.expunge_all()
             return pairs
 
+    def set_ratios(self, ratios: Dict[int, float]):
+        """
+        Set the ratio thresholds of pairs, given by pair id
+        """
+        session: Session
+        with self.db_session() as session:
+            session.bulk_update_mappings(Pair, [{"id": pair_id, "ratio": ratio} for pair_id, ratio in ratios.items()])
+
+        if self.model_cache is not None:
+            for pair_id, ratio in ratios.items():
+                self.model_cache.pairs_by_id[pair_id].ratio = ratio
+
     def log_scout(
         self,
         pair: Pair,
@@ -152,12 +259,16 @@ class Database:
         current_coin_price: float,
         other_coin_price: float,
     ):
-        session: Session
-        with self.db_session() as session:
-            pair = session.merge(pair)
-            sh = ScoutHistory(pair, target_ratio, current_coin_price, other_coin_price)
-            session.add(sh)
-            self.send_update(sh)
+        if self.scout_history_writer is None:
+            self.scout_history_writer = ScoutHistoryWriter(self)
+        self.scout_history_writer.add(pair, target_ratio, current_coin_price, other_coin_price)
+
+    def flush_scout_history(self):
+        """
+        Write the scout history logged so far in the background
+        """
+        if self.scout_history_writer is not None:
+            self.scout_history_writer.flush()
 
     def prune_scout_history(self):
         time_diff = datetime.now() - timedelta(hours=self.config.SCOUT_HISTORY_PRUNE_TIME)
@@ -166,66 +277,141 @@ class Database:
             session.query(ScoutHistory).filter(ScoutHistory.datetime < time_diff).delete()
 
     def prune_value_history(self):
+        start_time = time.monotonic()
+        now = datetime.now()
+        watermark = self.value_history_watermark
+
         session: Session
         with self.db_session() as session:
+            if watermark is None:
+                watermark = self._get_value_history_watermark(session)
+
             # Sets the first entry for each coin for each hour as 'hourly'
-            hourly_entries: List[CoinValue] = (
-                session.query(CoinValue).group_by(CoinValue.coin_id, func.strftime("%H", CoinValue.datetime)).all()
-            )
-            for entry in hourly_entries:
-                entry.interval = Interval.HOURLY
+            hour_start = watermark.replace(minute=0, second=0, microsecond=0) if watermark else None
+            hourly = self._mark_first_values(session, Interval.HOURLY, "%Y-%m-%d %H", hour_start)
 
             # Sets the first entry for each coin for each day as 'daily'
-            daily_entries: List[CoinValue] = (
-                session.query(CoinValue).group_by(CoinValue.coin_id, func.date(CoinValue.datetime)).all()
-            )
-            for entry in daily_entries:
-                entry.interval = Interval.DAILY
+            day_start = hour_start.replace(hour=0) if hour_start else None
+            daily = self._mark_first_values(session, Interval.DAILY, "%Y-%m-%d", day_start)
 
-            # Sets the first entry for each coin for each month as 'weekly'
-            # (Sunday is the start of the week)
-            weekly_entries: List[CoinValue] = (
-                session.query(CoinValue).group_by(CoinValue.coin_id, func.strftime("%Y-%W", CoinValue.datetime)).all()
-            )
-            for entry in weekly_entries:
-                entry.interval = Interval.WEEKLY
+            # Sets the first entry for each coin for each week as 'weekly'
+            # (Monday is the start of the week)
+            week_start = day_start - timedelta(days=day_start.weekday()) if day_start else None
+            weekly = self._mark_first_values(session, Interval.WEEKLY, "%Y-%W", week_start)
 
             # The last 24 hours worth of minutely entries will be kept, so
             # count(coins) * 1440 entries
-            time_diff = datetime.now() - timedelta(hours=24)
-            session.query(CoinValue).filter(
-                CoinValue.interval == Interval.MINUTELY, CoinValue.datetime < time_diff
-            ).delete()
+            time_diff = now - timedelta(hours=24)
+            deleted = (
+                session.query(CoinValue)
+                .filter(CoinValue.interval == Interval.MINUTELY, CoinValue.datetime < time_diff)
+                .delete(synchronize_session=False)
+            )
 
             # The last 28 days worth of hourly entries will be kept, so count(coins) * 672 entries
-            time_diff = datetime.now() - timedelta(days=28)
-            session.query(CoinValue).filter(
-                CoinValue.interval == Interval.HOURLY, CoinValue.datetime < time_diff
-            ).delete()
+            time_diff = now - timedelta(days=28)
+            deleted += (
+                session.query(CoinValue)
+                .filter(CoinValue.interval == Interval.HOURLY, CoinValue.datetime < time_diff)
+                .delete(synchronize_session=False)
+            )
 
             # The last years worth of daily entries will be kept, so count(coins) * 365 entries
-            time_diff = datetime.now() - timedelta(days=365)
-            session.query(CoinValue).filter(
-                CoinValue.interval == Interval.DAILY, CoinValue.datetime < time_diff
-            ).delete()
+            time_diff = now - timedelta(days=365)
+            deleted += (
+                session.query(CoinValue)
+                .filter(CoinValue.interval == Interval.DAILY, CoinValue.datetime < time_diff)
+                .delete(synchronize_session=False)
+            )
 
             # All weekly entries will be kept forever
 
+        self.value_history_watermark = now
+        self.logger.info(
+            f"Pruned value history in {time.monotonic() - start_time:.2f}s: {hourly} hourly, {daily} daily "
+            f"and {weekly} weekly entries marked, {deleted} entries deleted",
+            notification=False,
+        )
+
+    @staticmethod
+    def _get_value_history_watermark(session: Session) -> Optional[datetime]:
+        """
+        Every bucket is marked up to the last prune, which marked the newest entry that isn't minutely:
+        after a restart, the next prune only looks at the entries from its bucket
+        """
+        return (
+            session.query(func.max(CoinValue.datetime))
+            .filter(CoinValue.interval.in_([Interval.HOURLY, Interval.DAILY, Interval.WEEKLY]))
+            .scalar()
+        )
+
+    @staticmethod
+    def _mark_first_values(session: Session, interval: Interval, bucket_format: str, since: Optional[datetime]):
+        """
+        Set the first entry of each coin in each bucket (entries with the same datetime formatted with
+        bucket_format) as interval, in a single statement. Only the buckets from since are looked at,
+        since has to be the start of a bucket.
+        """
+        first_entries = session.query(func.min(CoinValue.id)).group_by(
+            CoinValue.coin_id, func.strftime(bucket_format, CoinValue.datetime)
+        )
+        if since is not None:
+            first_entries = first_entries.filter(CoinValue.datetime >= since)
+
+        # The first entry of a day is also the first of its hour, it must not go back to hourly
+        lower_intervals = list(Interval)[: list(Interval).index(interval)]
+        return (
+            session.query(CoinValue)
+            .filter(CoinValue.id.in_(first_entries.subquery()), CoinValue.interval.in_(lower_intervals))
+            .update({CoinValue.interval: interval}, synchronize_session=False)
+        )
+
     def create_database(self):
         Base.metadata.create_all(self.engine)
+        self._migrate_pairs_enabled()
+        self._create_missing_indexes()
+        session: Session
+        with self.db_session() as session:
+            backfill_value_rollups(session, self.logger)
+
+    def _migrate_pairs_enabled(self):
+        """
+        Pair.enabled used to be computed from the coins by a subquery on every query, add the column
+        to the databases created before it was stored
+        """
+        columns = [column["name"] for column in inspect(self.engine).get_columns(Pair.__tablename__)]
+        if "enabled" in columns:
+            return
+        self.logger.info("Adding enabled column to pairs")
+        with self.engine.begin() as connection:
+            connection.execute(f"ALTER TABLE {Pair.__tablename__} ADD COLUMN enabled BOOLEAN")
+        session: Session
+        with self.db_session() as session:
+            self._update_pairs_enabled(session)
+        self.model_cache = None
+
+    def _create_missing_indexes(self):
+        """
+        create_all only creates the indexes of the tables it creates, create the indexes added to
+        existing tables since
+        """
+        inspector = inspect(self.engine)
+        for table in Base.metadata.sorted_tables:
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    self.logger.info(f"Creating index {index.name}")
+                    index.create(self.engine)
 
     def start_trade_log(self, from_coin: Coin, to_coin: Coin, selling: bool):
         return TradeLog(self, from_coin, to_coin, selling)
 
     def send_update(self, model):
-        if not self.socketio_connect():
-            return
-
-        self.socketio_client.emit(
-            "update",
-            {"table": model.__tablename__, "data": model.info()},
-            namespace="/backend",
-        )
+        """
+        Send the row to the api server in the background, it is serialized now as the session that
+        loaded it may be closed by the time it is sent
+        """
+        self.update_publisher.publish(model.__tablename__, model.info())
 
     def migrate_old_state(self):
         """
@@ -253,6 +439,7 @@ class Database:
                             pair = session.merge(self.get_pair(from_coin, to_coin))
                             pair.ratio = ratio
                             session.add(pair)
+            self.model_cache = None
 
             os.rename(".current_coin_table", ".current_coin_table.old")
             self.logger.info(".current_coin_table renamed to .current_coin_table.old - " "You can now delete this file")
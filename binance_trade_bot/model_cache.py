@@ -0,0 +1,32 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import Coin, CurrentCoin, Pair
+
+
+class ModelCache:  # pylint: disable=too-few-public-methods
+    """
+    Detached copies of every coin and pair and of the current coin, loaded in a single session.
+
+    A Database with a cache answers the queries of the trader from it, and keeps it up to date when
+    it writes these models, so that scouting doesn't query the database. Only the trader writes
+    them, other processes query the database directly.
+    """
+
+    def __init__(self, session: Session):
+        coins: List[Coin] = session.query(Coin).all()
+        pairs: List[Pair] = session.query(Pair).all()
+        current_coin: Optional[CurrentCoin] = session.query(CurrentCoin).order_by(CurrentCoin.datetime.desc()).first()
+        self.current_coin: Optional[Coin] = current_coin.coin if current_coin is not None else None
+        session.expunge_all()
+
+        # The coins of the pairs are the same instances as these, joined in the same session
+        self.coins: Dict[str, Coin] = {coin.symbol: coin for coin in coins}
+        self.pairs: Dict[Tuple[str, str], Pair] = {(pair.from_coin_id, pair.to_coin_id): pair for pair in pairs}
+        self.pairs_by_id: Dict[int, Pair] = {pair.id: pair for pair in pairs}
+        self.pairs_from: Dict[str, List[Pair]] = {}
+        self.pairs_to: Dict[str, List[Pair]] = {}
+        for pair in pairs:
+            self.pairs_from.setdefault(pair.from_coin_id, []).append(pair)
+            self.pairs_to.setdefault(pair.to_coin_id, []).append(pair)
@@ -1,7 +1,7 @@
 import enum
 from datetime import datetime as _datetime
 
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
@@ -30,7 +30,14 @@ class CoinValue(Base):
 
     interval = Column(Enum(Interval))
 
-    datetime = Column(DateTime)
+    # Totaled by datetime, read by coin in datetime order, and pruned by interval and datetime
+    datetime = Column(DateTime, index=True)
+
+    __table_args__ = (
+        Index("ix_coin_value_coin_id_datetime", "coin_id", "datetime"),
+        Index("ix_coin_value_coin_id_interval_datetime", "coin_id", "interval", "datetime"),
+        Index("ix_coin_value_interval_datetime", "interval", "datetime"),
+    )
 
     def __init__(
         self,
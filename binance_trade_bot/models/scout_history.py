@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
@@ -20,7 +20,10 @@ class ScoutHistory(Base):
     current_coin_price = Column(Float)
     other_coin_price = Column(Float)
 
-    datetime = Column(DateTime)
+    # Pruned by datetime, and read by pair in datetime order
+    datetime = Column(DateTime, index=True)
+
+    __table_args__ = (Index("ix_scout_history_pair_id_datetime", "pair_id", "datetime"),)
 
     def __init__(
         self,
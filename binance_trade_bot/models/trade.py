@@ -34,7 +34,7 @@ class Trade(Base):  # pylint: disable=too-few-public-methods
     crypto_starting_balance = Column(Float)
     crypto_trade_amount = Column(Float)
 
-    datetime = Column(DateTime)
+    datetime = Column(DateTime, index=True)
 
     def __init__(self, alt_coin: Coin, crypto_coin: Coin, selling: bool):
         self.alt_coin = alt_coin
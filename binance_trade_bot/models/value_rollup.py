@@ -0,0 +1,79 @@
+from datetime import datetime as _datetime
+from datetime import timedelta
+
+from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import relationship
+
+from .base import Base
+from .coin_value import Interval
+
+
+def get_bucket_start(interval: Interval, datetime: _datetime) -> _datetime:
+    """
+    Get the start of the hour, day or week (starting on Monday) of datetime
+    """
+    bucket_start = datetime.replace(minute=0, second=0, microsecond=0)
+    if interval == Interval.HOURLY:
+        return bucket_start
+    bucket_start = bucket_start.replace(hour=0)
+    if interval == Interval.DAILY:
+        return bucket_start
+    return bucket_start - timedelta(days=bucket_start.weekday())
+
+
+class CoinValueRollup(Base):  # pylint: disable=too-few-public-methods
+    """
+    Average value of a coin over an hour, day or week, updated with every coin value logged
+    """
+
+    __tablename__ = "coin_value_rollup"
+
+    id = Column(Integer, primary_key=True)
+
+    coin_id = Column(String, ForeignKey("coins.symbol"))
+    coin = relationship("Coin")
+
+    interval = Column(Enum(Interval))
+    # Start of the bucket
+    datetime = Column(DateTime)
+    samples = Column(Integer)
+
+    # Last balance of the bucket
+    balance = Column(Float)
+    usd_value = Column(Float)
+    btc_value = Column(Float)
+
+    __table_args__ = (
+        Index("ix_coin_value_rollup_coin_id_interval_datetime", "coin_id", "interval", "datetime", unique=True),
+    )
+
+    def info(self):
+        return {
+            "balance": self.balance,
+            "usd_value": self.usd_value,
+            "btc_value": self.btc_value,
+            "datetime": self.datetime.isoformat(),
+        }
+
+
+class TotalValueRollup(Base):  # pylint: disable=too-few-public-methods
+    """
+    Average total value of all coins over an hour, day or week
+    """
+
+    __tablename__ = "total_value_rollup"
+
+    id = Column(Integer, primary_key=True)
+
+    interval = Column(Enum(Interval))
+    # Start of the bucket
+    datetime = Column(DateTime)
+    samples = Column(Integer)
+
+    usd_value = Column(Float)
+    btc_value = Column(Float)
+
+    __table_args__ = (Index("ix_total_value_rollup_interval_datetime", "interval", "datetime", unique=True),)
+
+    def info(self):
+        return {"datetime": self.datetime, "btc": self.btc_value, "usd": self.usd_value}
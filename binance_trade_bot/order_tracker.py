@@ -0,0 +1,46 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class OrderTracker:
+    """
+    Latest status of the orders reported by the executionReport events of the user data stream, which
+    a trade waiting for its order to fill can block on instead of polling the REST API.
+    """
+
+    def __init__(self, max_orders=100):
+        self.condition = threading.Condition()
+        self.orders: Dict[int, Dict] = OrderedDict()
+        self.max_orders = max_orders
+
+    def update(self, order_status: Dict):
+        with self.condition:
+            order_id = order_status["orderId"]
+            known_status = self.orders.get(order_id)
+            if known_status is not None and known_status["time"] > order_status["time"]:
+                return
+            self.orders[order_id] = order_status
+            self.orders.move_to_end(order_id)
+            while len(self.orders) > self.max_orders:
+                self.orders.popitem(last=False)
+            self.condition.notify_all()
+
+    def get(self, order_id: int) -> Optional[Dict]:
+        with self.condition:
+            return self.orders.get(order_id)
+
+    def wait(self, order_id: int, after_time: int, timeout: float) -> Optional[Dict]:
+        """
+        Wait up to timeout seconds for an update of the order more recent than after_time (in ms,
+        Binance time), and return it, or None if there was none
+        """
+
+        def get_update():
+            order_status = self.orders.get(order_id)
+            if order_status is not None and order_status["time"] > after_time:
+                return order_status
+            return None
+
+        with self.condition:
+            return self.condition.wait_for(get_update, timeout)
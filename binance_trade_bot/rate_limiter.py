@@ -0,0 +1,161 @@
+import threading
+import time
+from typing import Dict, Mapping, Tuple
+
+# Priorities of the REST calls, a lower value goes first
+ORDER = 0
+ORDER_STATUS = 1
+BALANCE = 2
+TICKER = 3
+HISTORY = 4
+
+# (method, endpoint): (priority, weight, weight when no symbol is given)
+ENDPOINTS: Dict[Tuple[str, str], Tuple[int, int, int]] = {
+    ("post", "order"): (ORDER, 1, 1),
+    ("delete", "order"): (ORDER, 1, 1),
+    ("delete", "openOrders"): (ORDER, 1, 1),
+    ("get", "order"): (ORDER_STATUS, 2, 2),
+    ("get", "openOrders"): (ORDER_STATUS, 3, 40),
+    ("get", "account"): (BALANCE, 10, 10),
+    ("post", "userDataStream"): (BALANCE, 1, 1),
+    ("put", "userDataStream"): (BALANCE, 1, 1),
+    ("delete", "userDataStream"): (BALANCE, 1, 1),
+    ("get", "ticker/price"): (TICKER, 1, 2),
+    ("get", "ticker/bookTicker"): (TICKER, 1, 2),
+    ("get", "ticker/24hr"): (TICKER, 1, 40),
+    ("get", "exchangeInfo"): (TICKER, 10, 10),
+    ("get", "klines"): (HISTORY, 1, 1),
+    ("get", "historicalTrades"): (HISTORY, 5, 5),
+    ("get", "allOrders"): (HISTORY, 10, 10),
+    ("get", "myTrades"): (HISTORY, 10, 10),
+}
+DEFAULT_ENDPOINT = (TICKER, 1, 1)
+
+# Error code of the requests refused for exceeding the request weight limit
+WEIGHT_EXCEEDED_ERROR = -1003
+
+
+def get_endpoint_limits(method: str, endpoint: str, has_symbol: bool) -> Tuple[int, int]:
+    """
+    Get the priority and request weight of a call to an endpoint of the /api REST API
+    """
+    priority, weight, weight_without_symbol = ENDPOINTS.get((method, endpoint), DEFAULT_ENDPOINT)
+    return priority, weight if has_symbol else weight_without_symbol
+
+
+class TokenBucket:
+    """
+    Weight left in a Binance limit window, refilled continuously at limit / interval per second
+    """
+
+    def __init__(self, limit: int, interval: float):
+        self.limit = limit
+        self.interval = interval
+        self.tokens = float(limit)
+        self.update_time = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.limit, self.tokens + (now - self.update_time) * self.limit / self.interval)
+        self.update_time = now
+
+    def wait_time(self, weight: float, reserve: float) -> float:
+        """
+        Seconds until weight can be taken while leaving reserve in the bucket
+        """
+        return max(0.0, (weight + reserve - self.tokens) * self.interval / self.limit)
+
+    def sync(self, used: int, now: float):
+        # The used weight reported by Binance also counts the requests of the other processes
+        # sharing the IP, such as the websocket reader
+        self.refill(now)
+        self.tokens = min(self.tokens, self.limit - used)
+
+
+class RateLimiter:
+    """
+    Spends the request weight of the IP on REST calls by priority, so that fetching tickers or
+    history can't use up the weight an order placement needs during a trade.
+
+    Each priority has to leave a share of the weight limit to the ones above it, and doesn't go
+    while a call of a higher priority is waiting. Order placements also take from the order count
+    limits.
+    """
+
+    RESERVES = {ORDER: 0.0, ORDER_STATUS: 0.05, BALANCE: 0.1, TICKER: 0.2, HISTORY: 0.4}
+
+    def __init__(self, weight_limit=1200, order_limit_10s=50, order_limit_1d=160000):
+        self.condition = threading.Condition()
+        self.weight = TokenBucket(weight_limit, 60)
+        self.orders_10s = TokenBucket(order_limit_10s, 10)
+        self.orders_1d = TokenBucket(order_limit_1d, 86400)
+        self.waiting = {priority: 0 for priority in self.RESERVES}
+        # Set when Binance answers 429 or 418, nothing is sent until then
+        self.blocked_until = 0.0
+
+    def acquire(self, priority: int, weight: int, order=False) -> float:
+        """
+        Wait until a call of that priority and weight can be sent, and return the time waited
+        """
+        start_time = time.monotonic()
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    wait_time = self._get_wait_time(priority, weight, order)
+                    if wait_time <= 0:
+                        break
+                    self.condition.wait(wait_time)
+            finally:
+                self.waiting[priority] -= 1
+                self.condition.notify_all()
+
+            self.weight.tokens -= weight
+            if order:
+                self.orders_10s.tokens -= 1
+                self.orders_1d.tokens -= 1
+        return time.monotonic() - start_time
+
+    def _get_wait_time(self, priority: int, weight: int, order: bool) -> float:
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if any(self.waiting[higher_priority] for higher_priority in range(priority)):
+            # woken up when the call of higher priority goes
+            return 1.0
+
+        self.weight.refill(now)
+        wait_time = self.weight.wait_time(weight, self.RESERVES[priority] * self.weight.limit)
+        if order:
+            for bucket in (self.orders_10s, self.orders_1d):
+                bucket.refill(now)
+                wait_time = max(wait_time, bucket.wait_time(1, 0))
+        return wait_time
+
+    def get_block_time(self) -> float:
+        """
+        Seconds left before requests are sent again after Binance asked to back off
+        """
+        with self.condition:
+            return max(0.0, self.blocked_until - time.monotonic())
+
+    def update(self, status_code: int, headers: Mapping[str, str]):
+        """
+        Sync the buckets with the usage Binance reported in the headers of a response
+        """
+        with self.condition:
+            now = time.monotonic()
+            used_weight = headers.get("x-mbx-used-weight-1m")
+            if used_weight is not None:
+                self.weight.sync(int(used_weight), now)
+            order_count = headers.get("x-mbx-order-count-10s")
+            if order_count is not None:
+                self.orders_10s.sync(int(order_count), now)
+            order_count = headers.get("x-mbx-order-count-1d")
+            if order_count is not None:
+                self.orders_1d.sync(int(order_count), now)
+
+            if status_code in (418, 429):
+                # 429 is the request weight being exceeded (-1003), 418 an IP ban for not backing off
+                retry_after = float(headers.get("Retry-After", 60))
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            self.condition.notify_all()
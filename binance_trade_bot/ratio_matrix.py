@@ -0,0 +1,84 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .models import Coin, Pair
+
+
+class RatioMatrix:
+    """
+    Holds the stored ratio thresholds of every enabled pair as an N×N array, indexed by the
+    position of the coins in `coins`, so that the jump scores of all pairs can be computed in a
+    single vectorized pass instead of pair by pair.
+    """
+
+    def __init__(self, coins: List[Coin], pairs: List[Pair], full_rescore_interval=60):
+        self.coins = coins
+        self.index: Dict[str, int] = {coin.symbol: i for i, coin in enumerate(coins)}
+
+        size = len(coins)
+        # Pairs that don't exist or don't have a ratio yet stay NaN, and so do their scores
+        self.ratios = np.full((size, size), np.nan)
+        self.pairs: Dict[Tuple[int, int], Pair] = {}
+        for pair in pairs:
+            i = self.index.get(pair.from_coin_id)
+            j = self.index.get(pair.to_coin_id)
+            if i is None or j is None:
+                continue
+            self.pairs[(i, j)] = pair
+            if pair.ratio is not None:
+                self.ratios[i, j] = pair.ratio
+
+        # Scores of the rows scouted so far, and the prices and fees they were computed from, so
+        # that the next scout of a row only re-scores the pairs whose inputs changed. Each row is
+        # still fully re-scored every `full_rescore_interval` scouts.
+        self.full_rescore_interval = full_rescore_interval
+        self.scores = np.full((size, size), np.nan)
+        self.scored_prices = np.full((size, size), np.nan)
+        self.scored_fees = np.full((size, size), np.nan)
+        self.scouts_since_full_rescore = np.full(size, full_rescore_interval)
+
+    def get_pairs_from(self, i: int) -> List[Tuple[int, Pair]]:
+        return [(j, self.pairs[(i, j)]) for j in range(len(self.coins)) if (i, j) in self.pairs]
+
+    def get_scores(
+        self, prices: np.ndarray, sell_fees: np.ndarray, buy_fees: np.ndarray, scout_multiplier: float
+    ) -> np.ndarray:
+        """
+        Score every pair at once: scores[i, j] is how far (p_i / p_j) net of fees is above the
+        stored threshold of jumping from coin i to coin j. Positive scores are viable jumps.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            price_ratios = prices[:, np.newaxis] / prices[np.newaxis, :]
+        transaction_fees = sell_fees[:, np.newaxis] + buy_fees[np.newaxis, :]
+        return price_ratios * (1 - transaction_fees * scout_multiplier) - self.ratios
+
+    def update_scores_from(
+        self, i: int, prices: np.ndarray, sell_fee: float, buy_fees: np.ndarray, scout_multiplier: float
+    ) -> np.ndarray:
+        """
+        Bring the scores of the jumps from coin i (the row `scores[i]`) up to date, and return the
+        mask of the pairs that had to be re-scored. A price change of coin i itself changes the whole
+        row, otherwise only the pairs whose target price or fee changed are re-scored.
+        """
+        fees = sell_fee + buy_fees
+        if self.scouts_since_full_rescore[i] >= self.full_rescore_interval or not _unchanged(
+            prices[i], self.scored_prices[i, i]
+        ):
+            rescored = np.ones(len(self.coins), dtype=bool)
+            self.scouts_since_full_rescore[i] = 0
+        else:
+            rescored = ~(_unchanged(prices, self.scored_prices[i]) & _unchanged(fees, self.scored_fees[i]))
+            self.scouts_since_full_rescore[i] += 1
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            price_ratios = prices[i] / prices[rescored]
+        self.scores[i, rescored] = price_ratios * (1 - fees[rescored] * scout_multiplier) - self.ratios[i, rescored]
+        self.scored_prices[i] = prices
+        self.scored_fees[i] = fees
+        return rescored
+
+
+def _unchanged(new, old):
+    # NaN never compares equal, but a price that is still missing hasn't changed either
+    return (new == old) | (np.isnan(new) & np.isnan(old))
@@ -0,0 +1,158 @@
+import calendar
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from flask import Response, g, make_response, request
+
+
+class CacheEntry(NamedTuple):
+    versions: Tuple[int, ...]
+    created: float
+    etag: str
+    last_modified: float
+    # None for the streamed responses, which are only revalidated
+    data: Optional[bytes]
+    mimetype: str
+    # Set by the view, like the cursor of the next page
+    headers: List[Tuple[str, str]]
+    # The data in each content encoding requested, encoded on the first request
+    encoded_data: Dict[str, bytes]
+
+
+class ResponseCache:
+    """
+    Keeps the responses of the api server, by endpoint and query parameters, until one of the tables
+    they are read from is updated.
+
+    The bot sends an update event for the rows it writes, which bumps the version of their table. Not
+    every write is sent (the coins and pairs set at startup, the prunes, the updates dropped while the
+    api server was down), so entries also expire after `max_age` seconds.
+
+    Responses carry an ETag and a Last-Modified header, and a client sending them back gets a 304
+    without the query running again while its entry is valid.
+    """
+
+    def __init__(self, max_entries=256, max_age=60.0, max_size=1024 * 1024):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple, CacheEntry]" = OrderedDict()
+        self.versions: Dict[str, int] = {}
+        self.last_modified: Dict[str, float] = {}
+        self.start_time = time.time()
+
+    def invalidate(self, table: str):
+        with self.lock:
+            self.versions[table] = self.versions.get(table, 0) + 1
+            self.last_modified[table] = time.time()
+
+    def cached(self, *tables: str) -> Callable:
+        """
+        Cache the responses of the view until one of tables is updated
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                with self.lock:
+                    versions = tuple(self.versions.get(table, 0) for table in tables)
+                    entry = self._get_entry(key, versions)
+                    last_modified = max(
+                        (self.last_modified[table] for table in tables if table in self.last_modified),
+                        default=self.start_time,
+                    )
+
+                if entry is not None:
+                    if entry.data is not None:
+                        g.response_cache_entry = entry
+                    if self._is_not_modified(entry):
+                        return self._add_headers(Response(status=304), entry)
+                    if entry.data is not None:
+                        response = Response(entry.data, mimetype=entry.mimetype, headers=entry.headers)
+                        return self._add_headers(response, entry)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+                created = time.time()
+                data = None
+                if not response.is_streamed and (response.content_length or 0) <= self.max_size:
+                    data = response.get_data()
+                etag = hashlib.sha1(repr((key, versions, created)).encode()).hexdigest()
+                headers = [
+                    (name, value)
+                    for name, value in response.headers.items()
+                    if name not in ("Content-Type", "Content-Length")
+                ]
+                entry = CacheEntry(versions, created, etag, last_modified, data, response.mimetype, headers, {})
+                if data is not None:
+                    g.response_cache_entry = entry
+                with self.lock:
+                    self.entries[key] = entry
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                return self._add_headers(response, entry)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def get_cached_data() -> Optional[bytes]:
+        """
+        Get the data of the cache entry the response to the current request was built from, or that it
+        revalidated with a 304
+        """
+        entry: Optional[CacheEntry] = g.get("response_cache_entry")
+        return entry.data if entry is not None else None
+
+    @staticmethod
+    def get_encoded_data(response: Response, encoding: str, encode: Callable[[bytes], bytes]) -> bytes:
+        """
+        Get the data of the response in the content encoding, encoded only once for the responses
+        built from the same cache entry
+        """
+        entry: Optional[CacheEntry] = g.get("response_cache_entry")
+        if entry is None:
+            return encode(response.get_data())
+        encoded_data = entry.encoded_data.get(encoding)
+        if encoded_data is None:
+            # Requests racing on the first encoding both encode the data, to the same result
+            encoded_data = entry.encoded_data[encoding] = encode(entry.data)
+        return encoded_data
+
+    def _get_entry(self, key: Tuple, versions: Tuple[int, ...]) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.versions != versions or time.time() - entry.created > self.max_age:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _is_not_modified(entry: CacheEntry) -> bool:
+        if request.if_none_match:
+            # The gzipped responses have a weak ETag
+            return request.if_none_match.contains_weak(entry.etag)
+        if request.if_modified_since is not None:
+            # HTTP dates only have a resolution of a second
+            return calendar.timegm(request.if_modified_since.utctimetuple()) >= int(entry.last_modified)
+        return False
+
+    @staticmethod
+    def _add_headers(response: Response, entry: CacheEntry) -> Response:
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        # Clients may keep the response, but have to check that it is still valid first
+        response.cache_control.no_cache = True
+        return response
@@ -0,0 +1,92 @@
+import threading
+import time
+from datetime import datetime
+from traceback import format_exc
+from typing import TYPE_CHECKING, List, Tuple
+
+from .models import Pair, ScoutHistory
+
+if TYPE_CHECKING:
+    from .database import Database
+
+
+class ScoutHistoryWriter:
+    """
+    Buffers the scout history rows logged by the trader and writes them from a background thread,
+    with a single bulk insert per flush, so that scouting never waits on the database.
+
+    The buffer is flushed when the trader asks for it at the end of a scout, when it holds
+    `max_rows` rows, or `max_delay` seconds after the oldest row was added.
+    """
+
+    def __init__(self, db: "Database", max_rows=500, max_delay=1.0):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        self.rows: List[Tuple[Pair, float, float, float, datetime]] = []
+        self.first_row_time = 0.0
+        self.flush_requested = False
+        threading.Thread(target=self.process_rows, daemon=True).start()
+
+    def add(self, pair: Pair, target_ratio: float, current_coin_price: float, other_coin_price: float):
+        with self.condition:
+            if not self.rows:
+                self.first_row_time = time.monotonic()
+            self.rows.append((pair, target_ratio, current_coin_price, other_coin_price, datetime.utcnow()))
+            if len(self.rows) >= self.max_rows:
+                self.condition.notify()
+
+    def flush(self):
+        """
+        Ask the writer to write the buffered rows now, without waiting for it
+        """
+        with self.condition:
+            if self.rows:
+                self.flush_requested = True
+                self.condition.notify()
+
+    def process_rows(self):
+        while True:
+            with self.condition:
+                while not self._is_due():
+                    timeout = self.first_row_time + self.max_delay - time.monotonic() if self.rows else None
+                    self.condition.wait(timeout)
+                rows = self.rows
+                self.rows = []
+                self.flush_requested = False
+
+            try:
+                self.write(rows)
+            except Exception:  # pylint: disable=broad-except
+                self.db.logger.error(f"Couldn't write {len(rows)} scout history rows\n{format_exc()}")
+
+    def _is_due(self):
+        if not self.rows:
+            return False
+        return (
+            self.flush_requested
+            or len(self.rows) >= self.max_rows
+            or time.monotonic() - self.first_row_time >= self.max_delay
+        )
+
+    def write(self, rows: List[Tuple[Pair, float, float, float, datetime]]):
+        with self.db.db_session() as session:
+            session.bulk_insert_mappings(
+                ScoutHistory,
+                [
+                    {
+                        "pair_id": pair.id,
+                        "target_ratio": target_ratio,
+                        "current_coin_price": current_coin_price,
+                        "other_coin_price": other_coin_price,
+                        "datetime": row_datetime,
+                    }
+                    for pair, target_ratio, current_coin_price, other_coin_price, row_datetime in rows
+                ],
+            )
+
+        for pair, target_ratio, current_coin_price, other_coin_price, row_datetime in rows:
+            sh = ScoutHistory(pair, target_ratio, current_coin_price, other_coin_price)
+            sh.datetime = row_datetime
+            self.db.send_update(sh)
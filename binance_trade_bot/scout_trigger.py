@@ -0,0 +1,62 @@
+import threading
+import time
+from typing import Iterable, Set
+
+
+class ScoutTrigger:
+    """
+    Decides when to scout from the ticker updates pushed by the websocket, instead of scouting on a
+    fixed timer.
+
+    Updates for watched symbols are collected until no new one arrived for `debounce` seconds, and
+    scouts are never started less than `min_interval` seconds apart.
+    """
+
+    def __init__(self, debounce: float, min_interval: float):
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.watched_symbols: Set[str] = set()
+        self.changed_symbols: Set[str] = set()
+        self.last_change_time = 0.0
+        self.last_scout_time = 0.0
+
+    def watch(self, symbols: Iterable[str]):
+        with self.lock:
+            self.watched_symbols = set(symbols)
+
+    def on_ticker_update(self, symbols: Set[str]):
+        """
+        Called from the websocket thread with the symbols whose price changed
+        """
+        with self.lock:
+            changed_symbols = symbols & self.watched_symbols
+            if not changed_symbols:
+                return
+            self.changed_symbols |= changed_symbols
+            self.last_change_time = time.monotonic()
+        self.event.set()
+
+    def wait(self, timeout: float) -> Set[str]:
+        """
+        Wait up to timeout seconds for a scout to be due, and return the symbols that changed since
+        the previous one. An empty set means no scout is needed yet.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.changed_symbols:
+                    due_time = max(self.last_change_time + self.debounce, self.last_scout_time + self.min_interval)
+                    if now >= due_time:
+                        changed_symbols = self.changed_symbols
+                        self.changed_symbols = set()
+                        self.last_scout_time = now
+                        return changed_symbols
+                else:
+                    due_time = deadline
+                self.event.clear()
+            if now >= deadline:
+                return set()
+            self.event.wait(min(due_time, deadline) - now)
@@ -14,6 +14,7 @@ class Strategy(AutoTrader):
         """
         Scout for potential jumps from the current coin to another coin
         """
+        self._start_scout_cycle()
         all_tickers = self.manager.get_all_market_tickers()
 
         current_coin = self.db.get_current_coin()
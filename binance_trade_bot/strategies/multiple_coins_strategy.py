@@ -8,6 +8,7 @@ class Strategy(AutoTrader):
         """
         Scout for potential jumps from the current coin to another coin
         """
+        self._start_scout_cycle()
         all_tickers = self.manager.get_all_market_tickers()
         have_coin = False
 
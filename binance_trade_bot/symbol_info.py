@@ -0,0 +1,98 @@
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from binance.client import Client
+
+from .logger import Logger
+
+SYMBOL_INFO_PATH = "data/symbol_info.json"
+
+
+class SymbolInfo:  # pylint: disable=too-few-public-methods
+    def __init__(self, symbol: str, filters: Dict[str, Dict]):
+        self.symbol = symbol
+        self.filters = filters
+
+        lot_size = filters.get("LOT_SIZE")
+        self.alt_tick = _step_precision(lot_size["stepSize"]) if lot_size else None
+
+        price_filter = filters.get("PRICE_FILTER")
+        self.price_tick = float(price_filter["tickSize"]) if price_filter else None
+
+        min_notional = filters.get("MIN_NOTIONAL")
+        self.min_notional = float(min_notional["minNotional"]) if min_notional else None
+
+
+class SymbolInfoStore:
+    """
+    Trading rules of every symbol, loaded with a single exchange info request and saved to disk, so
+    that the trader, the websocket reader and the backtester share them across restarts instead of
+    requesting the symbol info of each coin separately.
+    """
+
+    def __init__(self, binance_client: Client, logger: Logger, path=SYMBOL_INFO_PATH, ttl=43200):
+        self.binance_client = binance_client
+        self.logger = logger
+        self.path = path
+        self.ttl = ttl
+        self.symbols: Dict[str, SymbolInfo] = {}
+        self.update_time = 0.0
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        if time.time() - self.update_time > self.ttl:
+            self.load()
+        symbol_info = self.symbols.get(symbol)
+        if symbol_info is None and time.time() - self.update_time > 60:
+            # The symbol may have been listed since the rules were saved
+            self.fetch()
+            symbol_info = self.symbols.get(symbol)
+        return symbol_info
+
+    def load(self):
+        """
+        Load the rules saved on disk, or fetch them if they are missing or expired
+        """
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = None
+
+        if saved is None or time.time() - saved["time"] > self.ttl:
+            self.fetch()
+            return
+
+        self._set_symbols(saved["symbols"], saved["time"])
+
+    def fetch(self):
+        """
+        Fetch the rules of every symbol with a single request, and save them to disk
+        """
+        exchange_info = self.binance_client.get_exchange_info()
+        symbols = {
+            symbol["symbol"]: {_filter["filterType"]: _filter for _filter in symbol["filters"]}
+            for symbol in exchange_info["symbols"]
+        }
+        update_time = time.time()
+        self._set_symbols(symbols, update_time)
+
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"time": update_time, "symbols": symbols}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Couldn't save symbol info to {self.path}: {e}")
+
+    def _set_symbols(self, symbols: Dict[str, Dict[str, Dict]], update_time: float):
+        self.symbols = {symbol: SymbolInfo(symbol, filters) for symbol, filters in symbols.items()}
+        self.update_time = update_time
+
+
+def _step_precision(step_size: str):
+    # Number of decimals allowed by a step size such as "0.00100000", negative for steps above 1
+    if step_size.find("1") == 0:
+        return 1 - step_size.find(".")
+    return step_size.find("1") - 1
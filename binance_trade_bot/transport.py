@@ -0,0 +1,60 @@
+import random
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+import numpy as np
+from requests.adapters import HTTPAdapter
+
+
+def get_backoff_delay(attempt: int, base=0.5, max_delay=8.0) -> float:
+    """
+    Delay before retrying after attempt failed (0 for the first one): exponential backoff with full
+    jitter, so that processes failing together don't retry together
+    """
+    return random.uniform(0, min(max_delay, base * 2 ** attempt))
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    Keeps up to pool_size connections to Binance alive across calls, and applies the timeout of the
+    endpoint being called. Retries are left to the client, which knows which calls are safe to repeat.
+    """
+
+    def __init__(self, pool_size: int, get_timeout: Callable[[str, str], Tuple[float, float]]):
+        self.get_timeout = get_timeout
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+
+    def send(self, request, timeout=None, **kwargs):  # pylint: disable=arguments-differ
+        return super().send(request, timeout=self.get_timeout(request.method, request.url), **kwargs)
+
+
+class LatencyStats:
+    """
+    Durations of the last REST calls of each endpoint, to report their latency percentiles
+    """
+
+    def __init__(self, max_samples=1000):
+        self.lock = threading.Lock()
+        self.max_samples = max_samples
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def record(self, endpoint: str, duration: float):
+        with self.lock:
+            samples = self.samples.get(endpoint)
+            if samples is None:
+                samples = self.samples[endpoint] = deque(maxlen=self.max_samples)
+            samples.append(duration)
+
+    def get_percentiles(self, percentiles=(50, 90, 99)) -> Dict[str, Dict[str, float]]:
+        """
+        Get the number of samples and the latency percentiles (in ms) of each endpoint
+        """
+        with self.lock:
+            samples = {endpoint: list(durations) for endpoint, durations in self.samples.items()}
+        stats = {}
+        for endpoint, durations in samples.items():
+            values = np.percentile(durations, percentiles) * 1000
+            stats[endpoint] = {"count": len(durations)}
+            stats[endpoint].update({f"p{percentile}": float(value) for percentile, value in zip(percentiles, values)})
+        return stats
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from socketio import Client
+from socketio.exceptions import SocketIOError
+
+from .logger import Logger
+from .transport import get_backoff_delay
+
+
+class UpdatePublisher:
+    """
+    Sends the rows written by the bot to the api server from a background thread, so that a slow or
+    unreachable dashboard never delays trading.
+
+    Updates are queued as they are published, and sent in batches of up to `max_batch` updates per
+    emit. While the api server can't be reached, the thread reconnects with an exponential backoff and
+    the queue keeps the last `max_queue` updates, dropping the oldest ones.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        url="http://api:5123",
+        namespace="/backend",
+        max_queue=1000,
+        max_batch=100,
+        connect_timeout=5.0,
+    ):
+        self.logger = logger
+        self.url = url
+        self.namespace = namespace
+        self.max_batch = max_batch
+        self.connect_timeout = connect_timeout
+        self.socketio_client = Client()
+        self.condition = threading.Condition()
+        self.updates: Deque[Dict] = deque(maxlen=max_queue)
+        self.dropped = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def publish(self, table: str, data: Dict):
+        with self.condition:
+            if len(self.updates) == self.updates.maxlen:
+                self.dropped += 1
+            self.updates.append({"table": table, "data": data})
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.process_updates, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def process_updates(self):
+        batch: List[Dict] = []
+        failures = 0
+        while True:
+            if failures:
+                time.sleep(get_backoff_delay(failures, base=1, max_delay=60))
+
+            with self.condition:
+                while not self.updates and not batch:
+                    self.condition.wait()
+                # The updates of a batch that couldn't be sent are sent first, even if newer ones were dropped
+                while self.updates and len(batch) < self.max_batch:
+                    batch.append(self.updates.popleft())
+                dropped = self.dropped
+                self.dropped = 0
+
+            if dropped:
+                self.logger.warning(f"Dropped {dropped} updates to the api server", notification=False)
+
+            if self.send(batch):
+                batch = []
+                failures = 0
+            else:
+                failures += 1
+
+    def send(self, batch: List[Dict]) -> bool:
+        try:
+            if not self.connect():
+                return False
+            self.socketio_client.emit("updates", batch, namespace=self.namespace)
+            return True
+        except SocketIOError:
+            return False
+
+    def connect(self) -> bool:
+        if self.socketio_client.connected and self.socketio_client.namespaces:
+            return True
+        if not self.socketio_client.connected:
+            self.socketio_client.connect(self.url, namespaces=[self.namespace])
+        deadline = time.monotonic() + self.connect_timeout
+        while not self.socketio_client.namespaces:
+            if time.monotonic() > deadline:
+                self.socketio_client.disconnect()
+                return False
+            time.sleep(0.1)
+        return True
@@ -0,0 +1,114 @@
+from typing import List
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from .logger import Logger
+from .models import CoinValue, Interval, TotalValueRollup, get_bucket_start
+
+ROLLUP_INTERVALS = (Interval.HOURLY, Interval.DAILY, Interval.WEEKLY)
+
+# Start of the bucket of each rollup interval, in the format SQLAlchemy stores DateTime columns with
+BUCKET_START_SQL = {
+    Interval.HOURLY: "strftime('%Y-%m-%d %H:00:00.000000', datetime)",
+    Interval.DAILY: "strftime('%Y-%m-%d 00:00:00.000000', datetime)",
+    Interval.WEEKLY: "strftime('%Y-%m-%d 00:00:00.000000', datetime, 'weekday 0', '-6 days')",
+}
+
+# The averages are updated incrementally, a missing price leaves the average as it is
+COIN_VALUE_ROLLUP_UPSERT = text(
+    """
+    INSERT INTO coin_value_rollup (coin_id, interval, datetime, samples, balance, usd_value, btc_value)
+    VALUES (:coin_id, :interval, :datetime, 1, :balance, :usd_value, :btc_value)
+    ON CONFLICT (coin_id, interval, datetime) DO UPDATE SET
+        samples = samples + 1,
+        balance = excluded.balance,
+        usd_value = coalesce(
+            usd_value + (excluded.usd_value - usd_value) / (samples + 1), usd_value, excluded.usd_value
+        ),
+        btc_value = coalesce(
+            btc_value + (excluded.btc_value - btc_value) / (samples + 1), btc_value, excluded.btc_value
+        )
+    """
+).bindparams(bindparam("datetime", type_=DateTime))
+
+TOTAL_VALUE_ROLLUP_UPSERT = text(
+    """
+    INSERT INTO total_value_rollup (interval, datetime, samples, usd_value, btc_value)
+    VALUES (:interval, :datetime, 1, :usd_value, :btc_value)
+    ON CONFLICT (interval, datetime) DO UPDATE SET
+        samples = samples + 1,
+        usd_value = usd_value + (excluded.usd_value - usd_value) / (samples + 1),
+        btc_value = btc_value + (excluded.btc_value - btc_value) / (samples + 1)
+    """
+).bindparams(bindparam("datetime", type_=DateTime))
+
+
+def update_value_rollups(session: Session, coin_values: List[CoinValue]):
+    """
+    Add the coin values logged at a given time to the rollups of their hour, day and week
+    """
+    if not coin_values:
+        return
+    value_datetime = coin_values[0].datetime
+    usd_total = sum(cv.usd_value or 0 for cv in coin_values)
+    btc_total = sum(cv.btc_value or 0 for cv in coin_values)
+    for interval in ROLLUP_INTERVALS:
+        bucket_start = get_bucket_start(interval, value_datetime)
+        for cv in coin_values:
+            # The coin_id of the new coin values is only set when the session is flushed
+            session.execute(
+                COIN_VALUE_ROLLUP_UPSERT,
+                {
+                    "coin_id": cv.coin.symbol,
+                    "interval": interval.name,
+                    "datetime": bucket_start,
+                    "balance": cv.balance,
+                    "usd_value": cv.usd_value,
+                    "btc_value": cv.btc_value,
+                },
+            )
+        session.execute(
+            TOTAL_VALUE_ROLLUP_UPSERT,
+            {"interval": interval.name, "datetime": bucket_start, "usd_value": usd_total, "btc_value": btc_total},
+        )
+
+
+def backfill_value_rollups(session: Session, logger: Logger):
+    """
+    Fill the rollups in from the value history of databases created before they existed
+    """
+    if session.query(TotalValueRollup.id).first() is not None or session.query(CoinValue.id).first() is None:
+        return
+    logger.info("Filling value history rollups in")
+    for interval in ROLLUP_INTERVALS:
+        bucket_start = BUCKET_START_SQL[interval]
+        # With a single max(), SQLite takes the balance from the last row of the bucket
+        session.execute(
+            text(
+                f"""
+                INSERT INTO coin_value_rollup
+                    (coin_id, interval, datetime, samples, balance, usd_value, btc_value)
+                SELECT coin_id, :interval, bucket_start, samples, balance, usd_value, btc_value FROM (
+                    SELECT coin_id, {bucket_start} AS bucket_start, count(*) AS samples, balance,
+                        max(datetime), avg(balance * usd_price) AS usd_value,
+                        avg(balance * btc_price) AS btc_value
+                    FROM coin_value GROUP BY coin_id, bucket_start
+                )
+                """
+            ),
+            {"interval": interval.name},
+        )
+        session.execute(
+            text(
+                f"""
+                INSERT INTO total_value_rollup (interval, datetime, samples, usd_value, btc_value)
+                SELECT :interval, {bucket_start}, count(*), avg(usd_value), avg(btc_value) FROM (
+                    SELECT datetime, sum(balance * usd_price) AS usd_value,
+                        sum(balance * btc_price) AS btc_value
+                    FROM coin_value GROUP BY datetime
+                ) GROUP BY {bucket_start}
+                """
+            ),
+            {"interval": interval.name},
+        )
@@ -0,0 +1,22 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from binance_trade_bot.config import Config
+from binance_trade_bot.database import Database
+
+
+@pytest.fixture(name="config")
+def fixture_config(monkeypatch):
+    # The keys are only needed to build the config, the tests don't call Binance
+    monkeypatch.setenv("API_KEY", "test")
+    monkeypatch.setenv("API_SECRET_KEY", "test")
+    monkeypatch.setenv("CURRENT_COIN_SYMBOL", "BTC")
+    return Config()
+
+
+@pytest.fixture(name="db")
+def fixture_db(config: Config):
+    db = Database(MagicMock(), config, "sqlite://")
+    db.create_database()
+    return db
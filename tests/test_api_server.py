@@ -0,0 +1,40 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture(name="api_server", scope="module")
+def fixture_api_server(tmp_path_factory):
+    # The api server opens its log and database relatively to the working directory on import
+    path = tmp_path_factory.mktemp("api_server")
+    (path / "logs").mkdir()
+    (path / "data").mkdir()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(path)
+        monkeypatch.setenv("API_KEY", "test")
+        monkeypatch.setenv("API_SECRET_KEY", "test")
+        monkeypatch.setenv("CURRENT_COIN_SYMBOL", "BTC")
+        api_server = importlib.import_module("binance_trade_bot.api_server")
+        api_server.db.create_database()
+        api_server.db.set_coins(["AAA", "BBB", "CCC", "DDD", "EEE", "FFF"])
+        yield api_server
+
+
+def test_not_modified_keeps_gzip_validator(api_server):
+    client = api_server.app.test_client()
+
+    response = client.get("/api/pairs", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"].startswith('W/"')
+
+    not_modified = client.get(
+        "/api/pairs", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]}
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+    assert "Accept-Encoding" in not_modified.headers["Vary"]
+    assert "Content-Encoding" not in not_modified.headers
+
+    identity = client.get("/api/pairs", headers={"If-None-Match": response.headers["ETag"]})
+    assert identity.status_code == 304
+    assert not identity.headers["ETag"].startswith('W/"')
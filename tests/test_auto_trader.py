@@ -0,0 +1,32 @@
+from unittest.mock import MagicMock
+
+from binance_trade_bot.binance_api_manager import AllTickers
+from binance_trade_bot.config import Config
+from binance_trade_bot.database import Database
+from binance_trade_bot.strategies.default_strategy import Strategy
+
+SYMBOLS = ["AAA", "BBB", "CCC", "DDD"]
+
+
+def test_unchanged_scout_skips_every_pair(db: Database, config: Config):
+    db.update_publisher = MagicMock()
+    db.set_coins(SYMBOLS)
+    db.set_current_coin("AAA")
+
+    manager = MagicMock()
+    all_tickers = AllTickers([{"symbol": f"{symbol}USDT", "price": str(i + 1)} for i, symbol in enumerate(SYMBOLS)])
+    manager.get_all_market_tickers.return_value = all_tickers
+    manager.get_fee.return_value = 0.001
+    logger = MagicMock()
+    trader = Strategy(manager, db, logger, config)
+    trader.initialize_trade_thresholds()
+
+    trader.scout()
+    assert (trader.rescored_pairs, trader.skipped_pairs) == (len(SYMBOLS) - 1, 0)
+
+    trader.scout()
+    assert (trader.rescored_pairs, trader.skipped_pairs) == (0, len(SYMBOLS) - 1)
+    logger.debug.assert_called_with(
+        f"Scout cycle: 0 pairs re-scored, {len(SYMBOLS) - 1} unchanged pairs skipped", notification=False
+    )
+    manager.buy_alt.assert_not_called()
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from binance_trade_bot.database import Database
+from binance_trade_bot.models import Coin, CoinValue, Interval
+
+
+def add_values(db: Database, start: datetime, end: datetime):
+    session = db.SessionMaker()
+    coin = session.query(Coin).get("AAA")
+    value_datetime = start
+    while value_datetime < end:
+        session.add(CoinValue(coin, 1, 1, 1, datetime=value_datetime))
+        value_datetime += timedelta(minutes=10)
+    session.commit()
+    session.close()
+
+
+def test_prune_after_restart_is_incremental(db: Database):
+    db.set_coins(["AAA", "BBB"])
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    add_values(db, now - timedelta(hours=5), now - timedelta(hours=3))
+    db.prune_value_history()
+
+    # A restarted bot doesn't remember the last prune
+    db.value_history_watermark = None
+    add_values(db, now - timedelta(hours=3), now)
+    mark_first_values_wrapped = Database._mark_first_values  # pylint: disable=protected-access
+    with patch.object(Database, "_mark_first_values", wraps=mark_first_values_wrapped) as mark_first_values:
+        db.prune_value_history()
+
+    since = mark_first_values.call_args_list[0].args[3]
+    assert since == now - timedelta(hours=4)
+
+    session = db.SessionMaker()
+    for hour in range(1, 6):
+        first_value = (
+            session.query(CoinValue)
+            .filter(CoinValue.datetime >= now - timedelta(hours=hour))
+            .order_by(CoinValue.datetime.asc())
+            .first()
+        )
+        assert first_value.interval != Interval.MINUTELY
+    session.close()
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from binance_trade_bot.database import Database
+from binance_trade_bot.models import CoinValue, Interval, Pair, ScoutHistory, Trade
+
+
+def get_query_plan(session, query) -> str:
+    """
+    Run the query prefixed with EXPLAIN QUERY PLAN, so that SQLAlchemy still binds its parameters
+    """
+
+    def explain(_conn, _cursor, statement, parameters, _context, _executemany):
+        return f"EXPLAIN QUERY PLAN {statement}", parameters
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", explain, retval=True)
+    try:
+        rows = session.execute(query.statement).fetchall()
+    finally:
+        event.remove(engine, "before_cursor_execute", explain)
+    return "\n".join(row[-1] for row in rows)
+
+
+def assert_uses_index(plan: str, table: str, index: str):
+    assert index in plan, plan
+    for line in plan.splitlines():
+        # "SCAN TABLE t" on older SQLite versions, "SCAN t" on newer ones
+        if line.startswith("SCAN") and table in line.split():
+            assert "INDEX" in line, plan
+
+
+def test_scout_history_by_pair_uses_index(db: Database):
+    since = datetime.utcnow() - timedelta(hours=1)
+    with db.db_session() as session:
+        query = (
+            session.query(ScoutHistory)
+            .filter(ScoutHistory.pair_id == 1, ScoutHistory.datetime >= since)
+            .order_by(ScoutHistory.datetime.asc())
+        )
+        plan = get_query_plan(session, query)
+    assert_uses_index(plan, "scout_history", "ix_scout_history_pair_id_datetime")
+
+
+def test_scouting_history_of_current_coin_uses_index(db: Database):
+    # The query of /api/scouting_history, which walks the recent rows in datetime order and looks their pair up
+    since = datetime.utcnow() - timedelta(hours=1)
+    with db.db_session() as session:
+        query = (
+            session.query(ScoutHistory)
+            .join(ScoutHistory.pair)
+            .filter(Pair.from_coin_id == "BTC", ScoutHistory.datetime >= since)
+            .order_by(ScoutHistory.datetime.asc(), ScoutHistory.id.asc())
+        )
+        plan = get_query_plan(session, query)
+    assert_uses_index(plan, "scout_history", "ix_scout_history_datetime")
+
+
+def test_trade_history_by_datetime_uses_index(db: Database):
+    since = datetime.utcnow() - timedelta(days=1)
+    with db.db_session() as session:
+        query = session.query(Trade).filter(Trade.datetime >= since).order_by(Trade.datetime.asc())
+        plan = get_query_plan(session, query)
+    assert_uses_index(plan, "trade_history", "ix_trade_history_datetime")
+
+
+def test_coin_value_of_coin_uses_index(db: Database):
+    since = datetime.now() - timedelta(days=1)
+    with db.db_session() as session:
+        query = (
+            session.query(CoinValue)
+            .filter(CoinValue.coin_id == "BTC", CoinValue.datetime >= since)
+            .order_by(CoinValue.datetime.asc())
+        )
+        plan = get_query_plan(session, query)
+    assert_uses_index(plan, "coin_value", "ix_coin_value_coin_id_datetime")
+
+
+def test_coin_value_of_coin_and_interval_uses_index(db: Database):
+    # The lookups of the value history prune
+    since = datetime.now() - timedelta(days=1)
+    with db.db_session() as session:
+        query = session.query(CoinValue).filter(
+            CoinValue.coin_id == "BTC", CoinValue.interval == Interval.HOURLY, CoinValue.datetime >= since
+        )
+        plan = get_query_plan(session, query)
+    assert_uses_index(plan, "coin_value", "ix_coin_value_coin_id_interval_datetime")
+
+
+def test_coin_value_by_interval_uses_index(db: Database):
+    since = datetime.now() - timedelta(days=1)
+    with db.db_session() as session:
+        query = session.query(CoinValue).filter(CoinValue.interval == Interval.MINUTELY, CoinValue.datetime < since)
+        plan = get_query_plan(session, query)
+    assert_uses_index(plan, "coin_value", "ix_coin_value_interval_datetime")
@@ -0,0 +1,63 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify, request
+
+from binance_trade_bot.response_cache import ResponseCache
+
+
+@pytest.fixture(name="app")
+def fixture_app():
+    app = Flask(__name__)
+    response_cache = ResponseCache()
+    app.config["views"] = 0
+    app.config["encodes"] = 0
+
+    def encode(data: bytes) -> bytes:
+        app.config["encodes"] += 1
+        return gzip.compress(data)
+
+    @app.route("/api/history")
+    @response_cache.cached("history")
+    def history():
+        app.config["views"] += 1
+        cursor = request.args.get("cursor", type=int, default=0)
+        limit = request.args.get("limit", type=int)
+        response = jsonify(list(range(cursor, cursor + limit)))
+        response.headers["X-Next-Cursor"] = str(cursor + limit)
+        return response
+
+    @app.after_request
+    def compress_response(response):
+        if "gzip" in request.accept_encodings:
+            response.set_data(response_cache.get_encoded_data(response, "gzip", encode))
+            response.headers["Content-Encoding"] = "gzip"
+        return response
+
+    return app
+
+
+def test_cache_hit_keeps_next_cursor(app: Flask):
+    client = app.test_client()
+
+    first = client.get("/api/history?limit=10&cursor=20")
+    second = client.get("/api/history?limit=10&cursor=20")
+
+    assert app.config["views"] == 1
+    assert first.headers["X-Next-Cursor"] == "30"
+    assert second.headers["X-Next-Cursor"] == "30"
+    assert second.get_json() == first.get_json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+
+def test_cache_hit_is_encoded_once(app: Flask):
+    client = app.test_client()
+
+    first = client.get("/api/history?limit=10", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/api/history?limit=10", headers={"Accept-Encoding": "gzip"})
+    other = client.get("/api/history?limit=20", headers={"Accept-Encoding": "gzip"})
+
+    assert app.config["encodes"] == 2
+    assert second.data == first.data
+    assert gzip.decompress(second.data) == client.get("/api/history?limit=10").data
+    assert gzip.decompress(other.data) != gzip.decompress(first.data)